@@ -0,0 +1,161 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from execution_config import execution_plan
+from features import FEATURE_COLUMNS, HISTORY_WINDOW, build_features
+from forecast_engine import RecursiveForecaster
+from instrumentation import annotate, instrumented, span
+from model_store import load_manifest
+
+# Rolling-origin backtest.
+#
+# Replays the whole train + recursive forecast procedure from many forecast
+# origins (by default every week of the last year): for each origin a model is
+# fitted on the days before it with the production model's hyperparameters and
+# forecasts the next `horizon` days. The features and targets of the full
+# history are built once and placed in one shared-memory block that every
+# worker maps read-only, so origins run in parallel without copying the data.
+
+PROCESSED_FILE = os.path.join('data', 'processed_daily_sales.csv')
+MODEL_PATH = os.path.join('models', 'sales_model.ubj')
+BACKTEST_FILE = os.path.join('data', 'backtest_results.csv')
+DEFAULT_PARAMS = {'n_estimators': 500, 'learning_rate': 0.05, 'max_depth': 5, 'subsample': 0.8, 'colsample_bytree': 0.8}
+
+# Table columns: the model features, then the training target and the real sales
+TARGET_COL = len(FEATURE_COLUMNS)
+ACTUAL_COL = len(FEATURE_COLUMNS) + 1
+
+_shared = {}
+
+def model_params(model_path=MODEL_PATH):
+    # The hyperparameters of the current production model (defaults before the first training)
+    manifest = load_manifest(model_path)
+    if manifest is None:
+        return dict(DEFAULT_PARAMS)
+    return {k: manifest['params'].get(k, v) for k, v in DEFAULT_PARAMS.items()}
+
+def build_table(daily_sales):
+    # One float64 row per day; days without a full feature window keep NaN features
+    model_df = build_features(daily_sales, target_col='Sales_clipped')
+    table = np.full((len(daily_sales), len(FEATURE_COLUMNS) + 2), np.nan)
+    table[:, :TARGET_COL] = model_df[FEATURE_COLUMNS].reindex(daily_sales.index).values
+    table[:, TARGET_COL] = daily_sales['Sales_clipped'].values
+    table[:, ACTUAL_COL] = daily_sales['Sales'].values
+    return table
+
+def origin_positions(n_days, horizon=30, step=7, lookback=365, min_train_days=120):
+    # Row positions of the forecast origins, oldest first; the newest one ends on the last day
+    last = n_days - horizon
+    first = max(n_days - lookback, HISTORY_WINDOW + min_train_days)
+    return list(range(last, first - 1, -step))[::-1]
+
+def _attach(name, shape, start):
+    # Worker initializer: map the shared history once per process
+    shm = shared_memory.SharedMemory(name=name)
+    table = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    table.flags.writeable = False
+    _shared.update(shm=shm, table=table, start=pd.Timestamp(start))
+
+def _run_origin(task):
+    from xgboost import XGBRegressor
+    position, horizon, params, nthread = task
+    table = _shared['table']
+    train = table[:position]
+    train = train[~np.isnan(train[:, :TARGET_COL]).any(axis=1)]
+
+    start = time.perf_counter()
+    model = XGBRegressor(objective='reg:squarederror', random_state=42, n_jobs=nthread, **params)
+    model.fit(train[:, :TARGET_COL], train[:, TARGET_COL])
+    dates = pd.date_range(_shared['start'] + np.timedelta64(position, 'D'), periods=horizon)
+    forecast = RecursiveForecaster(model, table[:position, TARGET_COL]).forecast(dates)[0]
+    return position, forecast, table[position:position + horizon, ACTUAL_COL].copy(), time.perf_counter() - start
+
+def summarize(results, by):
+    # MAE / RMSE / MAPE per origin or per horizon; MAPE skips days without sales
+    error = results['Forecast'] - results['Actual']
+    parts = pd.DataFrame({
+        'abs': error.abs(),
+        'sq': error ** 2,
+        'ape': (error.abs() / results['Actual']).where(results['Actual'] > 0),
+    })
+    grouped = parts.groupby(results[by])
+    return pd.DataFrame({
+        'MAE': grouped['abs'].mean(),
+        'RMSE': np.sqrt(grouped['sq'].mean()),
+        'MAPE': grouped['ape'].mean() * 100,
+    })
+
+@instrumented('backtest')
+def run_backtest(horizon=30, step=7, lookback=365, min_train_days=120, workers=None, nthread=None, cores=None, path=BACKTEST_FILE):
+    print("--- Rolling-Origin Backtest ---")
+    start_time = time.time()
+    with span('prepare'):
+        daily_sales = pd.read_csv(PROCESSED_FILE, index_col='Date', parse_dates=['Date']).sort_index().asfreq('D')
+        table = build_table(daily_sales)
+        params = model_params()
+    positions = origin_positions(len(daily_sales), horizon, step, lookback, min_train_days)
+    if not positions:
+        raise ValueError(f"Not enough history for a {horizon}-day backtest ({len(daily_sales)} days).")
+    # Workers x XGBoost threads stay within the core budget
+    plan = execution_plan(len(daily_sales), cores, tasks=len(positions))
+    workers = min(workers or plan['backtest_workers'], len(positions))
+    nthread = nthread or plan['nthread']
+    annotate(rows=len(daily_sales), origins=len(positions), workers=workers, nthread=nthread, horizon=horizon)
+    print(f"--- {len(positions)} origins every {step} days, {horizon}-day horizon, {workers} worker(s) x {nthread} thread(s), params {params} ---")
+
+    tasks = [(position, horizon, params, nthread) for position in positions]
+    with span('origins', rows=len(positions), workers=workers):
+        if workers == 1:
+            _shared.update(table=table, start=daily_sales.index[0])
+            outcomes = [_run_origin(task) for task in tasks]
+        else:
+            shm = shared_memory.SharedMemory(create=True, size=table.nbytes)
+            try:
+                np.ndarray(table.shape, dtype=np.float64, buffer=shm.buf)[:] = table
+                with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                         initargs=(shm.name, table.shape, daily_sales.index[0])) as pool:
+                    outcomes = list(pool.map(_run_origin, tasks))
+            finally:
+                shm.close()
+                shm.unlink()
+
+    frames = []
+    for position, forecast, actual, _ in outcomes:
+        frames.append(pd.DataFrame({
+            'Origin': daily_sales.index[position],
+            'Horizon': np.arange(1, horizon + 1),
+            'Date': daily_sales.index[position:position + horizon],
+            'Actual': actual,
+            'Forecast': forecast,
+        }))
+    results = pd.concat(frames, ignore_index=True)
+    with span('export', rows=len(results)):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        results.to_csv(path, index=False, float_format='%.2f')
+
+    overall = summarize(results.assign(All='all'), 'All').iloc[0]
+    by_horizon = summarize(results, 'Horizon')
+    print(by_horizon.iloc[[0, 6, 13, horizon - 1] if horizon >= 14 else slice(None)].to_string(float_format=lambda v: f"{v:,.2f}"))
+    print(f"--- Overall MAE {overall['MAE']:,.2f} | RMSE {overall['RMSE']:,.2f} | MAPE {overall['MAPE']:.1f}% "
+          f"({sum(o[3] for o in outcomes):.1f}s of fitting in {time.time() - start_time:.1f}s) ---")
+    print(f"--- Backtest saved to: {path} ---")
+    return results
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of the train + recursive forecast procedure.")
+    parser.add_argument('--horizon', type=int, default=30, help="Days forecast from each origin")
+    parser.add_argument('--step', type=int, default=7, help="Days between origins")
+    parser.add_argument('--lookback', type=int, default=365, help="Only place origins within this many days of the end")
+    parser.add_argument('--min-train-days', type=int, default=120, help="Minimum training rows before the first origin")
+    parser.add_argument('--workers', type=int, help="Parallel origins (default: from the CPU budget, see execution_config.py)")
+    parser.add_argument('--nthread', type=int, help="XGBoost threads per worker (default: from the CPU budget)")
+    parser.add_argument('--cores', type=int, help="CPU budget shared by workers and threads (default: $FORECAST_CORES or all cores)")
+    args = parser.parse_args()
+    run_backtest(horizon=args.horizon, step=args.step, lookback=args.lookback, min_train_days=args.min_train_days,
+                 workers=args.workers, nthread=args.nthread, cores=args.cores)
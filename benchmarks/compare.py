@@ -0,0 +1,58 @@
+import json
+import sys
+
+# Compare two benchmark result files (e.g. the previous commit vs. this one).
+# A step regresses when a metric grows by more than the relative threshold and
+# by more than a small absolute floor, so millisecond noise on tiny steps is ignored.
+
+METRICS = {
+    'wall_s': {'unit': 's', 'floor': 0.05},
+    'peak_rss_mb': {'unit': 'MB', 'floor': 16},
+}
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+def dataset_key(report):
+    # What identifies the input data; older results kept generate_s inside 'dataset'
+    return {k: v for k, v in report['dataset'].items() if k != 'generate_s'}
+
+def compare(base, new, threshold=0.10):
+    rows, regressions = [], []
+    for step in base['steps']:
+        if step not in new['steps']:
+            continue
+        for metric, spec in METRICS.items():
+            old_value, new_value = base['steps'][step].get(metric), new['steps'][step].get(metric)
+            if old_value is None or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value if old_value else 0.0
+            regressed = change > threshold and new_value - old_value > spec['floor']
+            rows.append((step, metric, old_value, new_value, change, regressed))
+            if regressed:
+                regressions.append(f"{step} {metric}: {old_value:.3f} -> {new_value:.3f} {spec['unit']} ({change:+.1%})")
+    return rows, regressions
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files and flag regressions.")
+    parser.add_argument('base', help="Baseline result JSON")
+    parser.add_argument('new', help="New result JSON")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative increase counted as a regression (default 0.10)")
+    args = parser.parse_args()
+    base, new = load(args.base), load(args.new)
+
+    if dataset_key(base) != dataset_key(new) or base['options'] != new['options']:
+        print("WARNING: the two runs used different datasets or options; numbers are not directly comparable.")
+    if base['environment'] != new['environment']:
+        print("WARNING: the two runs come from different environments (machine or library versions).")
+    print(f"--- {base['commit'][:10]} -> {new['commit'][:10]} ({new['dataset']['rows']:,} lines, {new['dataset']['skus']:,} SKUs) ---")
+
+    rows, regressions = compare(base, new, args.threshold)
+    for step, metric, old_value, new_value, change, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{step:<16} {metric:<12} {old_value:>10.3f} -> {new_value:>10.3f}  {change:>+7.1%}{flag}")
+    if regressions:
+        print(f"--- {len(regressions)} regression(s) above {args.threshold:.0%} ---")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,249 @@
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Benchmark suite for the forecasting pipeline.
+#
+# Generates (once, then reuses) a synthetic Online Retail file at the requested
+# scale and times the pipeline steps on it in a scratch workspace. Every step
+# runs in its own child process, so its peak RSS is its own and one step's
+# allocations never skew the next. Results go to benchmarks/results/ as one
+# JSON file per commit and scale; compare two of them with compare.py.
+
+BENCH_FOLDER = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_FOLDER)
+DATA_FOLDER = os.path.join(BENCH_FOLDER, 'data')
+RESULTS_FOLDER = os.path.join(BENCH_FOLDER, 'results')
+RESULT_SCHEMA = 1
+
+# In dependency order: each step reads what the previous ones wrote
+STEPS = ['preprocess', 'features', 'train', 'forecast', 'powerbi_export']
+LIBRARIES = ['pandas', 'numpy', 'xgboost', 'scikit-learn', 'pyarrow']
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def peak_rss_mb():
+    # VmHWM is reset by exec; ru_maxrss would inherit the parent's high-water mark on Linux
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+# ---------------------------------------------------------
+# Child side: run one step inside the workspace
+# ---------------------------------------------------------
+def prepare_step(step, dataset, options):
+    # Returns (callable, row count); imports and loading the step's inputs are not part of the timing
+    sys.path.insert(0, ROOT)
+    import pandas as pd
+    import xgboost  # noqa: F401  (imported lazily by the pipeline modules)
+    if step == 'preprocess':
+        import pyarrow.parquet as pq
+        from preprocess_data import preprocess
+        rows = pq.ParquetFile(dataset).metadata.num_rows
+        return lambda: preprocess(source=dataset, stream=True, chunksize=options['chunksize']), rows
+    daily = pd.read_csv(os.path.join('data', 'processed_daily_sales.csv'), index_col='Date', parse_dates=['Date']).sort_index()
+    if step == 'features':
+        from sales_forecasting import build_advanced_features
+        return lambda: build_advanced_features(daily), len(daily)
+    if step == 'train':
+        from sales_forecasting import train_model
+        return lambda: train_model(search=options['search'], search_budget=options['search_budget']), len(daily)
+    if step == 'forecast':
+        from predict_future import generate_forecast
+        return lambda: generate_forecast(horizon=options['horizon']), options['horizon']
+    if step == 'powerbi_export':
+        from predict_future import FORECAST_FILE, export_powerbi
+        forecast = pd.read_csv(FORECAST_FILE, index_col='Date', parse_dates=['Date'])
+        return lambda: export_powerbi(daily, forecast), len(daily) + len(forecast)
+    raise ValueError(f"Unknown step: {step}")
+
+def run_child(step, dataset, options, result_path):
+    import_start = time.perf_counter()
+    call, rows = prepare_step(step, dataset, options)
+    setup_s = time.perf_counter() - import_start
+    baseline_rss = current_rss_mb()
+
+    if options['tracemalloc']:
+        import tracemalloc
+        tracemalloc.start()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    call()
+    wall_s, cpu_s = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    traced_peak = None
+    if options['tracemalloc']:
+        traced_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+
+    result = {
+        'wall_s': wall_s,
+        'cpu_s': cpu_s,
+        'setup_s': setup_s,
+        'baseline_rss_mb': baseline_rss,
+        'peak_rss_mb': peak_rss_mb(),
+        'tracemalloc_peak_mb': traced_peak,
+        'rows': rows,
+        'rows_per_s': rows / wall_s if wall_s > 0 else None,
+    }
+    with open(result_path, 'w') as f:
+        json.dump(result, f)
+
+# ---------------------------------------------------------
+# Parent side: dataset, workspace, aggregation, metadata
+# ---------------------------------------------------------
+def dataset_path(rows, skus, seed):
+    return os.path.join(DATA_FOLDER, f"retail_{rows}r_{skus}s_seed{seed}.parquet")
+
+def ensure_dataset(rows, skus, seed):
+    path = dataset_path(rows, skus, seed)
+    if os.path.exists(path):
+        return path, None
+    sys.path.insert(0, BENCH_FOLDER)
+    from synthetic_retail import generate
+    start = time.time()
+    generate(path, rows, skus, seed=seed)
+    return path, time.time() - start
+
+def run_step(step, dataset, options, workspace):
+    result_path = os.path.join(workspace, f".result_{step}.json")
+    log_path = os.path.join(workspace, 'logs', f"{step}.log")
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, 'a') as log:
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', step,
+                               '--dataset', dataset, '--options', json.dumps(options), '--result', result_path],
+                              cwd=workspace, stdout=log, stderr=subprocess.STDOUT)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Benchmark step '{step}' failed, see {log_path}")
+    with open(result_path) as f:
+        return json.load(f)
+
+def summarize(samples):
+    walls = [s['wall_s'] for s in samples]
+    peaks = [s['tracemalloc_peak_mb'] for s in samples if s['tracemalloc_peak_mb'] is not None]
+    return {
+        'wall_s': statistics.median(walls),
+        'wall_min_s': min(walls),
+        'cpu_s': statistics.median(s['cpu_s'] for s in samples),
+        'peak_rss_mb': max(s['peak_rss_mb'] for s in samples),
+        'baseline_rss_mb': samples[0]['baseline_rss_mb'],
+        'tracemalloc_peak_mb': max(peaks) if peaks else None,
+        'rows': samples[0]['rows'],
+        'rows_per_s': samples[0]['rows'] / statistics.median(walls) if statistics.median(walls) > 0 else None,
+        'samples': samples,
+    }
+
+def git_info():
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        except OSError:
+            return ''
+    return {'commit': git('rev-parse', 'HEAD') or 'unknown',
+            'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+def environment():
+    from importlib import metadata
+    versions = {}
+    for name in LIBRARIES:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'cpu_count': os.cpu_count(), 'libraries': versions}
+
+def run_benchmarks(rows, skus, seed=42, steps=STEPS, repeat=1, search='halving', search_budget=None,
+                   chunksize=500_000, horizon=30, tracemalloc=False, label=None, output=None, keep_workspace=False):
+    dataset, generate_s = ensure_dataset(rows, skus, seed)
+    options = {'chunksize': chunksize, 'search': search, 'search_budget': search_budget,
+               'horizon': horizon, 'tracemalloc': tracemalloc}
+    workspace = tempfile.mkdtemp(prefix='forecast_bench_')
+    print(f"--- Benchmarking {rows:,} lines / {skus:,} SKUs in {workspace} ---")
+
+    results = {}
+    try:
+        last_needed = max(STEPS.index(step) for step in steps)
+        for step in STEPS[:last_needed + 1]:
+            # Unselected upstream steps still run once to produce the inputs
+            runs = repeat if step in steps else 1
+            samples = [run_step(step, dataset, options, workspace) for _ in range(runs)]
+            if step in steps:
+                results[step] = summarize(samples)
+                print(f"{step:<16} {results[step]['wall_s']:>9.3f} s  {results[step]['peak_rss_mb']:>8.1f} MB peak RSS")
+    finally:
+        if not keep_workspace:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    info = git_info()
+    report = {
+        'schema': RESULT_SCHEMA,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        **info,
+        'environment': environment(),
+        'dataset': {'rows': rows, 'skus': skus, 'seed': seed, 'file': os.path.basename(dataset)},
+        # None when the cached dataset was reused; kept out of 'dataset' so compare.py ignores it
+        'timings': {'generate_s': generate_s},
+        'options': options,
+        'repeat': repeat,
+        'steps': results,
+    }
+    label = label or f"{rows}r-{skus}s"
+    output = output or os.path.join(RESULTS_FOLDER, f"{info['commit'][:10]}{'-dirty' if info['dirty'] else ''}_{label}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"--- Results written to {output} ---")
+    return report
+
+if __name__ == "__main__":
+    import argparse
+    sys.path.insert(0, BENCH_FOLDER)
+    from synthetic_retail import SCALES
+    parser = argparse.ArgumentParser(description="Time and memory-profile the pipeline on synthetic data.")
+    parser.add_argument('--scale', choices=list(SCALES), default='small', help="Preset dataset size")
+    parser.add_argument('--rows', type=int, help="Transaction lines (overrides the preset)")
+    parser.add_argument('--skus', type=int, help="Distinct StockCodes (overrides the preset)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--steps', nargs='+', choices=STEPS, default=STEPS, help="Steps to record")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per recorded step (the median is reported)")
+    parser.add_argument('--search', choices=['random', 'halving'], default='halving', help="Hyperparameter search used by the train step")
+    parser.add_argument('--search-budget', type=float, help="Cap the search at this many seconds (the train time then measures the budget, not the code)")
+    parser.add_argument('--chunksize', type=int, default=500_000, help="Rows per chunk for the streaming preprocess")
+    parser.add_argument('--tracemalloc', action='store_true', help="Also record the Python heap peak (slows the steps down)")
+    parser.add_argument('--output', help="Result file (default: benchmarks/results/<commit>_<scale>.json)")
+    parser.add_argument('--keep-workspace', action='store_true', help="Keep the scratch workspace and step logs")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--dataset', help=argparse.SUPPRESS)
+    parser.add_argument('--options', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args.child, args.dataset, json.loads(args.options), args.result)
+    else:
+        preset = SCALES[args.scale]
+        rows, skus = args.rows or preset['rows'], args.skus or preset['skus']
+        label = args.scale if (rows, skus) == (preset['rows'], preset['skus']) else None
+        run_benchmarks(rows, skus, seed=args.seed, steps=args.steps, repeat=args.repeat, search=args.search,
+                       search_budget=args.search_budget, chunksize=args.chunksize, tracemalloc=args.tracemalloc,
+                       label=label, output=args.output, keep_workspace=args.keep_workspace)
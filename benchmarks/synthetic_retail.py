@@ -0,0 +1,136 @@
+import pandas as pd
+import numpy as np
+import os
+import time
+
+# Synthetic Online Retail generator.
+#
+# Writes transaction lines with the schema of `Online Retail.xlsx` (InvoiceNo,
+# StockCode, Description, Quantity, InvoiceDate, UnitPrice, CustomerID, Country)
+# at any scale. Rows are generated and written chunk by chunk, so 100M lines
+# need no more memory than one chunk, and every chunk has its own seed so the
+# same parameters always produce the same file.
+#
+# The shape follows the real data: invoices of ~20 lines in chronological order,
+# no trading on Saturdays, a Q4/December peak, Zipf-distributed SKU popularity,
+# ~2% cancellations ('C' invoices with negative quantities), ~25% missing
+# CustomerIDs, a few zero prices and a UK-dominated country mix.
+
+COUNTRIES = ['United Kingdom', 'Germany', 'France', 'EIRE', 'Spain', 'Netherlands', 'Belgium',
+             'Switzerland', 'Portugal', 'Australia', 'Norway', 'Italy', 'Channel Islands', 'Finland']
+COUNTRY_WEIGHTS = np.array([0.89, 0.02, 0.02, 0.015, 0.01, 0.01, 0.008, 0.007, 0.005, 0.004, 0.003, 0.003, 0.003, 0.002])
+LINES_PER_INVOICE = 20
+PACK_SIZES = np.array([1, 2, 3, 4, 6, 12, 24])
+SCALES = {
+    'small': {'rows': 500_000, 'skus': 100},
+    'medium': {'rows': 5_000_000, 'skus': 1_000},
+    'large': {'rows': 20_000_000, 'skus': 2_000},
+    'xlarge': {'rows': 100_000_000, 'skus': 4_000},
+}
+
+def day_weights(dates):
+    # Relative trading volume per day: closed on Saturdays, growing towards a November/December peak
+    dayofweek = dates.dayofweek.values
+    month = dates.month.values
+    weights = np.where(dayofweek == 5, 0.0, 1.0)
+    weights *= np.where(dayofweek == 6, 0.6, 1.0)
+    weights *= 1 + 0.6 * np.isin(month, [9, 10]) + 1.2 * np.isin(month, [11, 12])
+    weights *= np.linspace(1.0, 1.3, len(dates))
+    return weights / weights.sum()
+
+def sku_catalog(n_skus, seed):
+    rng = np.random.default_rng([seed, 0])
+    codes = np.array([str(10000 + i) for i in range(n_skus)], dtype=object)
+    variants = rng.random(n_skus) < 0.15
+    codes[variants] = [c + 'ABCDE'[i % 5] for i, c in enumerate(codes[variants])]
+    popularity = 1 / np.arange(1, n_skus + 1) ** 1.1
+    return {
+        'codes': codes,
+        'descriptions': np.array([f"SYNTHETIC ITEM {i:05d}" for i in range(n_skus)], dtype=object),
+        'prices': np.round(np.exp(rng.normal(1.0, 0.8, n_skus)).clip(0.1, 50), 2),
+        'popularity': popularity / popularity.sum(),
+    }
+
+def generate_chunk(index, start_row, n_rows, total_rows, catalog, day_cdf, dates, seed):
+    rng = np.random.default_rng([seed, index + 1])
+    total_invoices = max(total_rows // LINES_PER_INVOICE, 1)
+
+    # Invoice of every line; invoices are numbered globally so chunks line up
+    rows = np.arange(start_row, start_row + n_rows)
+    invoice = rows // LINES_PER_INVOICE
+    first, last = invoice[0], invoice[-1]
+    n_invoices = last - first + 1
+
+    # Invoice timestamps follow the daily volume curve (inverse CDF), so they are sorted
+    position = (np.arange(first, last + 1) + 0.5) / total_invoices
+    day = np.minimum(np.searchsorted(day_cdf, position), len(dates) - 1)
+    day_start = np.concatenate([[0.0], day_cdf])[day]
+    within_day = ((position - day_start) / (day_cdf[day] - day_start)).clip(0, 1)
+    seconds = (8 * 3600 + within_day * 12 * 3600).astype(np.int64)
+    invoice_dates = dates.values[day] + seconds.astype('timedelta64[s]')
+
+    cancelled = rng.random(n_invoices) < 0.02
+    customer = np.where(rng.random(n_invoices) < 0.25, np.nan, rng.integers(12346, 18288, n_invoices).astype(float))
+    country = rng.choice(len(COUNTRIES), n_invoices, p=COUNTRY_WEIGHTS / COUNTRY_WEIGHTS.sum())
+
+    local = invoice - first
+    sku = rng.choice(len(catalog['codes']), n_rows, p=catalog['popularity'])
+    quantity = rng.geometric(0.35, n_rows) * PACK_SIZES[rng.integers(0, len(PACK_SIZES), n_rows)]
+    quantity = np.where(cancelled[local], -quantity, quantity)
+    price = np.where(rng.random(n_rows) < 0.003, 0.0, catalog['prices'][sku])
+
+    invoice_no = pd.Series(536365 + invoice).astype(str)
+    invoice_no = invoice_no.where(~cancelled[local], 'C' + invoice_no)
+    return pd.DataFrame({
+        'InvoiceNo': invoice_no.values,
+        'StockCode': catalog['codes'][sku],
+        'Description': catalog['descriptions'][sku],
+        'Quantity': quantity.astype(np.int64),
+        'InvoiceDate': invoice_dates[local],
+        'UnitPrice': price,
+        'CustomerID': customer[local],
+        'Country': np.array(COUNTRIES, dtype=object)[country[local]],
+    })
+
+def generate(path, rows, skus, start='2010-12-01', end='2011-12-09', seed=42, chunk_rows=1_000_000):
+    # Writes Parquet (or CSV when the path ends in .csv); returns the path
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    start_time = time.time()
+    dates = pd.date_range(start, end, freq='D')
+    day_cdf = np.cumsum(day_weights(dates))
+    catalog = sku_catalog(skus, seed)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    is_csv = path.endswith('.csv')
+
+    writer = None
+    for index, start_row in enumerate(range(0, rows, chunk_rows)):
+        chunk = generate_chunk(index, start_row, min(chunk_rows, rows - start_row), rows, catalog, day_cdf, dates, seed)
+        if is_csv:
+            chunk.to_csv(tmp_path, mode='w' if index == 0 else 'a', header=index == 0, index=False)
+        else:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table)
+        print(f"--- Generated {start_row + len(chunk):,} / {rows:,} lines ---")
+    if writer is not None:
+        writer.close()
+    os.replace(tmp_path, path)
+    print(f"--- Synthetic dataset written to {path} in {time.time() - start_time:.1f} seconds ---")
+    return path
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Generate a synthetic Online Retail transaction file.")
+    parser.add_argument('path', help="Output .parquet or .csv file")
+    parser.add_argument('--scale', choices=list(SCALES), default='small', help="Preset size (rows / SKUs)")
+    parser.add_argument('--rows', type=int, help="Transaction lines (overrides the preset)")
+    parser.add_argument('--skus', type=int, help="Distinct StockCodes (overrides the preset)")
+    parser.add_argument('--start', default='2010-12-01')
+    parser.add_argument('--end', default='2011-12-09')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    scale = SCALES[args.scale]
+    generate(args.path, args.rows or scale['rows'], args.skus or scale['skus'], args.start, args.end, args.seed)
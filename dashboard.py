@@ -5,10 +5,16 @@ import plotly.express as px
 import plotly.graph_objects as go
 import plotly.figure_factory as ff
 import os
-import subprocess
 from datetime import datetime
 from scipy.stats import gaussian_kde
 
+from instrumentation import instrumented, span
+from job_runner import active_job, latest_job, read_log, start_job
+from backtest import summarize as summarize_backtest
+from downsample import downsample
+from powerbi_dataset import DATASET_FOLDER, manifest_file, read_dataset
+from sales_cube import CUBE_FILE, cube_countries, cube_slice, load_cube
+
 # --- CONFIGURATION & THEME ---
 st.set_page_config(
     page_title="Forecasting Lab Pro | Enterprise AI",
@@ -141,26 +147,131 @@ st.markdown("""
 # --- UTILITIES ---
 DATA_PATH = os.path.join('data', 'powerbi_master_report.csv')
 VAL_PATH = os.path.join('data', 'validation_results.csv')
+BACKTEST_PATH = os.path.join('data', 'backtest_results.csv')
+REGIONAL_PATH = os.path.join('data', 'regional_sales.csv')
+DAYS_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Data layer: every table and derived view is cached process-wide (shared by all
+# sessions) under the source file's (mtime, size). A rewritten file gets a new key,
+# and max_entries evicts the stale versions.
+def file_version(path):
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def read_table(path, version, date_cols=()):
+    # Recorded only on a cache miss, i.e. when the file actually had to be read
+    with span('dashboard/read_table', path=path) as s:
+        df = pd.read_csv(path)
+        for col in date_cols:
+            df[col] = pd.to_datetime(df[col])
+        s.set(rows=len(df))
+    return df
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def read_report_dataset(version):
+    with span('dashboard/read_dataset', path=DATASET_FOLDER) as s:
+        df = read_dataset(DATASET_FOLDER)
+        s.set(rows=len(df))
+    return df
+
+def report_version():
+    # The partitioned Parquet report when it exists, the legacy CSV otherwise
+    version = file_version(manifest_file(DATASET_FOLDER))
+    return ('parquet', version) if version else ('csv', file_version(DATA_PATH))
 
 def load_data():
-    if os.path.exists(DATA_PATH):
-        df = pd.read_csv(DATA_PATH)
-        df['Date'] = pd.to_datetime(df['Date'])
-        return df
-    return None
+    source, version = report_version()
+    if version is None:
+        return None
+    return read_report_dataset(version) if source == 'parquet' else read_table(DATA_PATH, version, ('Date',))
 
 def load_val_data():
-    if os.path.exists(VAL_PATH):
-        df = pd.read_csv(VAL_PATH)
-        df['Date'] = pd.to_datetime(df['Date'])
-        return df
-    return None
+    version = file_version(VAL_PATH)
+    return read_table(VAL_PATH, version, ('Date',)) if version else None
+
+def load_backtest_data():
+    version = file_version(BACKTEST_PATH)
+    return read_table(BACKTEST_PATH, version, ('Origin', 'Date')) if version else None
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def read_cube(version):
+    with span('dashboard/read_cube', path=CUBE_FILE) as s:
+        cube = load_cube(CUBE_FILE)
+        s.set(rows=len(cube))
+    return cube
+
+def load_sales_cube():
+    version = file_version(CUBE_FILE)
+    return read_cube(version) if version else None
 
-REGIONAL_PATH = os.path.join('data', 'regional_sales.csv')
 def load_regional_data():
-    if os.path.exists(REGIONAL_PATH):
-        return pd.read_csv(REGIONAL_PATH)
-    return None
+    version = file_version(REGIONAL_PATH)
+    return read_table(REGIONAL_PATH, version) if version else None
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def export_csv(path, version):
+    with open(path, 'rb') as f:
+        return f.read()
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def report_csv(version, _df):
+    # CSV download when only the Parquet dataset is written
+    return _df.to_csv(index=False).encode()
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def backtest_views(version, _bt):
+    # Error per forecast origin and per day ahead across all origins
+    return summarize_backtest(_bt, 'Origin'), summarize_backtest(_bt, 'Horizon')
+
+@st.cache_data(max_entries=4, show_spinner=False)
+@instrumented('dashboard/derived_views')
+def derived_views(version, _df):
+    # Weekday means, weekly resamples and KDE curves of one report version
+    actuals = _df[_df['Category'] == 'Actual']
+    forecast = _df[_df['Category'] == 'Forecast']
+    hist_vals = actuals['Revenue'].tail(150).values
+    pred_vals = forecast['Revenue'].values
+    full_r = np.linspace(min(min(hist_vals), min(pred_vals))*0.5, max(max(hist_vals), max(pred_vals))*1.2, 200)
+    return {
+        'weekday_rev': actuals.groupby('Weekday', observed=True)['Revenue'].mean().reindex(DAYS_ORDER).fillna(0),
+        'hist_weekly': actuals.set_index('Date')['Revenue'].resample('W').sum().tail(4),
+        'pred_weekly': forecast.set_index('Date')['Revenue'].resample('W').sum(),
+        'kde_x': full_r,
+        'kde_hist': gaussian_kde(hist_vals)(full_r),
+        'kde_pred': gaussian_kde(pred_vals)(full_r),
+    }
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def history_points(version, _actuals, start, end):
+    # The visible history window at a bounded point count; a new window re-queries at full detail
+    with span('dashboard/downsample', rows=len(_actuals)) as s:
+        points = downsample(_actuals, 'Date', 'Revenue', start=start, end=end)
+        s.set(points=len(points))
+    return points
+
+@st.fragment(run_every=2)
+def job_status_panel():
+    # Polls the background job; new artifacts show up through the mtime-keyed cache
+    job = latest_job()
+    if job is None:
+        return
+    icons = {'queued': '⏳', 'running': '🔄', 'succeeded': '✅', 'failed': '❌'}
+    st.caption(f"{icons.get(job['state'], '')} Job {job['id']}: {job['state'].upper()}")
+    for stage in job['stages']:
+        st.caption(f"{'✔' if stage['status'] == 'done' else '…'} Step {stage['step']}: {stage['name']}")
+    if job['state'] in ('running', 'failed'):
+        with st.expander("Pipeline log"):
+            st.code(read_log(job['id'], tail=20) or "(waiting for output)")
+    if job['state'] == 'succeeded' and st.session_state.get('synced_job') != job['id']:
+        # First poll after completion: redraw the page with the swapped-in artifacts
+        st.session_state['synced_job'] = job['id']
+        if active_job() is None and st.session_state.get('seen_running') == job['id']:
+            st.rerun()
+    if job['state'] == 'running':
+        st.session_state['seen_running'] = job['id']
 
 # --- SIDEBAR ---
 with st.sidebar:
@@ -168,13 +279,16 @@ with st.sidebar:
     st.markdown("## ⚙️ SYSTEM CONTROL")
     st.markdown("Protocol: Autonomous AI Node")
     if st.button("🚀 RETRAIN & SYNC ENGINE"):
-        with st.spinner("Analyzing high-dimensional datasets..."):
-            subprocess.run(["python", "main.py", "--refresh"], capture_output=True)
-            st.rerun()
+        # Runs in the background; the dashboard keeps serving the current artifacts
+        job_id, started = start_job()
+        st.toast(f"Retrain job {job_id} {'started' if started else 'already running'}.")
+    job_status_panel()
     st.markdown("---")
     if os.path.exists(DATA_PATH):
-        df_exp = pd.read_csv(DATA_PATH)
-        st.download_button("Download Full Intel (.csv)", df_exp.to_csv(index=False), "ai_sales_export.csv")
+        st.download_button("Download Full Intel (.csv)", export_csv(DATA_PATH, file_version(DATA_PATH)), "ai_sales_export.csv")
+    elif file_version(manifest_file(DATASET_FOLDER)):
+        version = file_version(manifest_file(DATASET_FOLDER))
+        st.download_button("Download Full Intel (.csv)", report_csv(version, read_report_dataset(version)), "ai_sales_export.csv")
     st.markdown("<br>"*2, unsafe_allow_html=True)
     st.markdown(f"""
     <div style='background: rgba(16, 185, 129, 0.1); padding: 15px; border-radius: 10px; border-left: 4px solid #10b981;'>
@@ -219,11 +333,14 @@ st.markdown("<br>", unsafe_allow_html=True)
 
 df = load_data()
 val_df = load_val_data()
+bt_df = load_backtest_data()
 reg_df = load_regional_data()
+cube = load_sales_cube()
 
 if df is not None:
     actuals = df[df['Category'] == 'Actual']
     forecast = df[df['Category'] == 'Forecast']
+    views = derived_views(report_version(), df)
 
     # KPI Row
     c1, c2, c3, c4 = st.columns(4)
@@ -241,8 +358,13 @@ if df is not None:
     with st.container(border=True):
         fig_unified = go.Figure()
         
-        # Historical
+        # Historical: the slider sets the visible window, which is re-queried and downsampled on every change
         hist_trim = actuals.tail(90)
+        if len(actuals) > 90:
+            first_day, last_day = actuals['Date'].iloc[0].to_pydatetime(), actuals['Date'].iloc[-1].to_pydatetime()
+            window = st.slider("Visible history", min_value=first_day, max_value=last_day,
+                               value=(hist_trim['Date'].iloc[0].to_pydatetime(), last_day), format="DD MMM YYYY")
+            hist_trim = history_points(report_version(), actuals, *window)
         fig_unified.add_trace(go.Scatter(x=hist_trim['Date'], y=hist_trim['Revenue'], name='Historical Sales (Actual)', line=dict(color='#60a5fa', width=2)))
         
         # Forecast Horizon Vertical Line
@@ -281,12 +403,18 @@ if df is not None:
     with st.container(border=True):
         fig_risk = go.Figure()
         if not forecast.empty:
+            # Simulated P10/P90 when the forecast has them, the old fixed band otherwise
+            simulated = 'P10' in forecast.columns and forecast['P10'].notna().all()
+            upper = forecast['P90'] if simulated else forecast['Revenue']*1.2
+            lower = forecast['P10'] if simulated else forecast['Revenue']*0.8
             fig_risk.add_trace(go.Scatter(
                 x=pd.concat([forecast['Date'], forecast['Date'][::-1]]),
-                y=pd.concat([forecast['Revenue']*1.2, (forecast['Revenue']*0.8)[::-1]]),
+                y=pd.concat([upper, lower[::-1]]),
                 fill='toself', fillcolor='rgba(255, 255, 255, 0.05)',
-                line=dict(color='rgba(255,255,255,0)'), name='80% Confidence Band'
+                line=dict(color='rgba(255,255,255,0)'), name='80% Prediction Interval (P10-P90)' if simulated else '80% Confidence Band'
             ))
+            if simulated:
+                fig_risk.add_trace(go.Scatter(x=forecast['Date'], y=forecast['P50'], name='Median Path (P50)', line=dict(color='#f59e0b', width=1, dash='dot')))
             fig_risk.add_trace(go.Scatter(x=forecast['Date'], y=forecast['Revenue'], name='Core Prediction Path', line=dict(color='white', width=2)))
         
         fig_risk.update_layout(
@@ -319,12 +447,35 @@ if df is not None:
         with st.container(border=True):
             st.markdown("<p style='font-size: 0.9rem; font-weight: 700; color: #94a3b8;'>Optimal Operational Days</p>", unsafe_allow_html=True)
             st.markdown("<p style='font-size: 0.7rem; color: #64748b; margin-top: -15px;'>Revenue concentration by day of the week.</p>", unsafe_allow_html=True)
-            weekday_rev = actuals.groupby('Weekday')['Revenue'].mean().reindex(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']).fillna(0)
+            weekday_rev = views['weekday_rev']
             fig_opt = px.bar(x=weekday_rev.index, y=weekday_rev.values, labels={'x': '', 'y': ''}, color_discrete_sequence=['#6366f1'])
             fig_opt.update_layout(template="plotly_dark", paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', height=325, margin=dict(l=0,r=0,t=10,b=0))
             st.plotly_chart(fig_opt, use_container_width=True)
             st.markdown("<div style='background: rgba(99, 102, 241, 0.05); padding: 10px; border-radius: 8px; border-left: 3px solid #6366f1;'><p style='font-size: 0.75rem; font-weight: 700; color: #818cf8; margin: 0;'>Resource Tip:</p><p style='font-size: 0.7rem; color: #94a3b8; margin: 0;'>Scale staffing levels during high-volume days revealed in the distribution above.</p></div>", unsafe_allow_html=True)
 
+    if cube is not None:
+        # Drill-down served from the pre-aggregated cube: one index lookup per slice
+        with st.container(border=True):
+            st.markdown("<p style='font-size: 0.9rem; font-weight: 700; color: #94a3b8;'>Regional Drill-Down</p>", unsafe_allow_html=True)
+            d1, d2, d3 = st.columns(3)
+            country = d1.selectbox("Country", ['All'] + cube_countries(cube))
+            grain = d2.radio("Resolution", ['D', 'W', 'M'], index=1, horizontal=True,
+                             format_func={'D': 'Daily', 'W': 'Weekly', 'M': 'Monthly'}.get)
+            months = d3.selectbox("Window", [3, 6, 12, None], index=1,
+                                  format_func=lambda m: f"Last {m} months" if m else "Full history")
+            drill = downsample(cube_slice(cube, grain, country=country, months=months), None, 'Sales')
+            fig_drill = go.Figure()
+            fig_drill.add_trace(go.Bar(x=drill.index, y=drill['Sales'], name='Revenue', marker_color='#6366f1'))
+            fig_drill.add_trace(go.Scatter(x=drill.index, y=drill['Quantity'], name='Units', yaxis='y2', line=dict(color='#10b981', width=2)))
+            fig_drill.update_layout(
+                template="plotly_dark", paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
+                height=325, margin=dict(l=0, r=0, t=10, b=0),
+                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="left", x=0),
+                yaxis=dict(title='Revenue (£)', showgrid=True, gridcolor='rgba(255,255,255,0.05)'),
+                yaxis2=dict(title='Units', overlaying='y', side='right', showgrid=False)
+            )
+            st.plotly_chart(fig_drill, use_container_width=True)
+
     st.markdown("<br>", unsafe_allow_html=True)
 
     # 4. SECTION: Comparative Analysis & Model Verification
@@ -334,11 +485,7 @@ if df is not None:
         # KDE
         with st.container(border=True):
             st.markdown("<p style='font-size: 0.9rem; font-weight: 700; color: #94a3b8;'>Sales Volume Density Comparison</p>", unsafe_allow_html=True)
-            hist_vals = actuals['Revenue'].tail(150).values
-            pred_vals = forecast['Revenue'].values
-            full_r = np.linspace(min(min(hist_vals), min(pred_vals))*0.5, max(max(hist_vals), max(pred_vals))*1.2, 200)
-            k_h = gaussian_kde(hist_vals)(full_r)
-            k_p = gaussian_kde(pred_vals)(full_r)
+            full_r, k_h, k_p = views['kde_x'], views['kde_hist'], views['kde_pred']
             
             fig_kde = go.Figure()
             fig_kde.add_trace(go.Scatter(x=full_r, y=k_h, fill='toself', name='Past (Actual)', fillcolor='rgba(96, 165, 250, 0.2)', line=dict(color='#60a5fa')))
@@ -357,14 +504,41 @@ if df is not None:
                 fig_v.update_layout(template="plotly_dark", paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', height=300, margin=dict(l=0, r=0, t=0, b=0), legend=dict(orientation="h", x=0, y=1.1))
                 st.plotly_chart(fig_v, use_container_width=True)
 
+    # Rolling-origin backtest (python backtest.py or main.py --backtest)
+    if bt_df is not None:
+        st.markdown("<br>", unsafe_allow_html=True)
+        by_origin, by_horizon = backtest_views(file_version(BACKTEST_PATH), bt_df)
+        st.markdown(f'<p class="section-title">Rolling-Origin Back-Test ({len(by_origin)} Origins)</p>', unsafe_allow_html=True)
+        b_left, b_right = st.columns(2)
+        with b_left:
+            with st.container(border=True):
+                st.markdown("<p style='font-size: 0.9rem; font-weight: 700; color: #94a3b8;'>Forecast Error per Origin</p>", unsafe_allow_html=True)
+                fig_bo = go.Figure()
+                by_origin = downsample(by_origin, None, 'MAE')
+                fig_bo.add_trace(go.Scatter(x=by_origin.index, y=by_origin['MAE'], name='MAE', mode='lines+markers', line=dict(color='#60a5fa')))
+                fig_bo.add_trace(go.Scatter(x=by_origin.index, y=by_origin['RMSE'], name='RMSE', mode='lines+markers', line=dict(color='#ef4444', dash='dash')))
+                fig_bo.update_layout(template="plotly_dark", paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', height=300, margin=dict(l=0, r=0, t=0, b=0), legend=dict(orientation="h", x=0, y=1.1))
+                st.plotly_chart(fig_bo, use_container_width=True)
+        with b_right:
+            with st.container(border=True):
+                st.markdown("<p style='font-size: 0.9rem; font-weight: 700; color: #94a3b8;'>Error by Days Ahead (MAE bars, MAPE line)</p>", unsafe_allow_html=True)
+                fig_bh = go.Figure()
+                fig_bh.add_trace(go.Bar(x=by_horizon.index, y=by_horizon['MAE'], name='MAE', marker_color='#6366f1'))
+                fig_bh.add_trace(go.Scatter(x=by_horizon.index, y=by_horizon['MAPE'], name='MAPE %', yaxis='y2', line=dict(color='#f59e0b')))
+                fig_bh.update_layout(template="plotly_dark", paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', height=300, margin=dict(l=0, r=0, t=0, b=0),
+                                     yaxis2=dict(overlaying='y', side='right', showgrid=False), legend=dict(orientation="h", x=0, y=1.1))
+                st.plotly_chart(fig_bh, use_container_width=True)
+
     st.markdown("<br>", unsafe_allow_html=True)
     
     # 5. SECTION: Weekly Summary
     st.markdown('<p class="section-title">Institutional Forecasting Analysis</p>', unsafe_allow_html=True)
     with st.container(border=True):
         st.markdown("<p style='font-size: 0.9rem; font-weight: 700; color: #94a3b8;'>Weekly Sales Pulse (Actual vs Forecast)</p>", unsafe_allow_html=True)
-        hist_weekly = actuals.set_index('Date')['Revenue'].resample('W').sum().tail(4)
-        pred_weekly = forecast.set_index('Date')['Revenue'].resample('W').sum()
+        hist_weekly, pred_weekly = views['hist_weekly'], views['pred_weekly']
+        if cube is not None:
+            # Weekly actuals straight from the cube's week rollup
+            hist_weekly = cube_slice(cube, 'W')['Sales'].tail(4)
         fig_weekly = go.Figure()
         fig_weekly.add_trace(go.Bar(x=[f"Actual W{i+1}" for i in range(len(hist_weekly))], y=hist_weekly, name='Actual', marker_color='#334155'))
         fig_weekly.add_trace(go.Bar(x=[f"Forecast W{i+1}" for i in range(len(pred_weekly))], y=pred_weekly, name='Forecast', marker_color='#6366f1'))
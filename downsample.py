@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+# Server-side downsampling for dashboard charts.
+#
+# A chart never needs more points than it has horizontal pixels. Series longer
+# than `max_points` are reduced with Largest-Triangle-Three-Buckets (LTTB): the
+# first and last points are kept, the rest is split into equal buckets, and
+# each bucket keeps the point forming the largest triangle with the point kept
+# before it and the mean of the next bucket. Peaks and dips survive, while the
+# payload stays bounded whatever the history length.
+
+MAX_POINTS = 720
+
+def lttb_indices(x, y, n_out):
+    # Positions of the n_out points to keep, in order
+    x = np.asarray(x, dtype=np.float64)
+    x = x - x[0] if len(x) else x
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        nxt = slice(hi, edges[i + 2]) if i + 2 < len(edges) else slice(n - 1, n)
+        cx, cy = x[nxt].mean(), y[nxt].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+def downsample(df, x_col, y_col, max_points=MAX_POINTS, start=None, end=None):
+    # Rows of the visible [start, end] window, reduced to at most max_points by y_col's shape
+    x = df[x_col] if x_col is not None else df.index.to_series()
+    if start is not None or end is not None:
+        visible = np.ones(len(df), dtype=bool)
+        if start is not None:
+            visible &= (x >= pd.Timestamp(start)).values
+        if end is not None:
+            visible &= (x <= pd.Timestamp(end)).values
+        df, x = df[visible], x[visible]
+    if len(df) <= max_points:
+        return df
+    x_values = x.values.astype('datetime64[ns]').astype(np.int64) if np.issubdtype(x.dtype, np.datetime64) else x.values
+    return df.iloc[lttb_indices(x_values, df[y_col].values, max_points)]
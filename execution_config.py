@@ -0,0 +1,74 @@
+import os
+
+# CPU budget for every parallel part of the pipeline.
+#
+# Parallel model fits (search candidates, backtest origins) each run XGBoost
+# with its own thread pool, so `jobs x threads` must stay within the core
+# budget instead of running cores x cores threads. On small tables a tree fit
+# barely speeds up past one thread, so the cores go to more parallel fits; on
+# large tables each fit gets more threads and fewer fits run side by side.
+# Single fits (warm-start updates, the halving refit, the direct and global
+# models) get as many threads as their table keeps busy, up to the whole
+# budget; prediction (rows unknown) uses the whole budget.
+#
+# Precedence: explicit arguments (main.py / sales_forecasting.py --cores,
+# backtest.py --workers / --nthread, render_plots.py --workers) > environment
+# variables below > the automatic split. FORECAST_CORES caps the total, e.g.
+# to leave room for other workloads on the same machine. FORECAST_NTHREAD pins
+# the XGBoost threads of every fit and prediction, parallel or single.
+
+CORES_ENV = 'FORECAST_CORES'
+OVERRIDE_ENV = {
+    'search_jobs': 'FORECAST_SEARCH_JOBS',
+    'nthread': 'FORECAST_NTHREAD',
+    'plot_workers': 'FORECAST_PLOT_WORKERS',
+    'backtest_workers': 'FORECAST_BACKTEST_WORKERS',
+}
+ROWS_PER_THREAD = 20_000    # training rows that keep one more XGBoost thread busy
+MAX_MODEL_THREADS = 8       # per-fit threads beyond this rarely pay off
+
+def available_cores():
+    # Cores this process may run on (respects taskset / container CPU sets)
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def _env_int(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+def core_budget(cores=None):
+    return max(1, cores or _env_int(CORES_ENV) or available_cores())
+
+def execution_plan(rows=0, cores=None, tasks=None):
+    # {'cores', 'nthread', 'search_jobs', 'backtest_workers', 'fit_nthread', 'plot_workers'}
+    # rows: training rows per fit; tasks: parallel fits available (search candidates x folds, origins)
+    budget = core_budget(cores)
+    pinned = _env_int(OVERRIDE_ENV['nthread'])
+    nthread = pinned or min(budget, MAX_MODEL_THREADS, max(1, rows // ROWS_PER_THREAD))
+    jobs = max(1, budget // nthread)
+    if tasks is not None and tasks < jobs:
+        # Fewer fits than slots: hand the idle cores to the fits that do run
+        jobs = max(1, tasks)
+        nthread = pinned or max(1, budget // jobs)
+    return {
+        'cores': budget,
+        'nthread': nthread,
+        'search_jobs': _env_int(OVERRIDE_ENV['search_jobs']) or jobs,
+        'backtest_workers': _env_int(OVERRIDE_ENV['backtest_workers']) or jobs,
+        'fit_nthread': pinned or (min(budget, max(1, rows // ROWS_PER_THREAD)) if rows else budget),
+        'plot_workers': _env_int(OVERRIDE_ENV['plot_workers']) or budget,
+    }
+
+def describe(plan):
+    return ", ".join(f"{k}={v}" for k, v in plan.items())
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Show how the CPU budget is split for a given table size.")
+    parser.add_argument('--rows', type=int, default=0, help="Training rows per model fit")
+    parser.add_argument('--cores', type=int, help=f"Core budget (default: ${CORES_ENV} or all available cores)")
+    parser.add_argument('--tasks', type=int, help="Parallel fits available, e.g. search candidates x folds")
+    args = parser.parse_args()
+    print(describe(execution_plan(args.rows, args.cores, args.tasks)))
@@ -0,0 +1,113 @@
+import pandas as pd
+import numpy as np
+
+# Single source of truth for the model inputs: training and every forecast
+# path build exactly these columns, in exactly this order.
+LAGS = [1, 7, 14, 21, 30]
+CALENDAR_FEATURES = [
+    'dayofweek', 'month', 'day', 'is_weekend', 'is_december', 'days_to_christmas',
+    'month_sin', 'month_cos', 'day_sin', 'day_cos',
+]
+FEATURE_COLUMNS = CALENDAR_FEATURES + [f'lag_{lag}' for lag in LAGS] + [
+    'diff_1_7', 'rolling_mean_7', 'rolling_std_7', 'rolling_mean_30',
+]
+HISTORY_WINDOW = max(LAGS)
+
+def calendar_features(dates):
+    # Pure array arithmetic: Christmas is day-of-year 359 (360 in leap years)
+    dates = pd.DatetimeIndex(dates)
+    dayofweek = dates.dayofweek.values
+    month = dates.month.values
+    days_to_christmas = 359 + dates.is_leap_year.astype(int) - dates.dayofyear.values
+    return np.column_stack([
+        dayofweek, month, dates.day.values,
+        dayofweek >= 5, month == 12,
+        np.where((days_to_christmas >= 0) & (days_to_christmas <= 30), days_to_christmas, 31),
+        np.sin(2 * np.pi * month / 12), np.cos(2 * np.pi * month / 12),
+        np.sin(2 * np.pi * dayofweek / 7), np.cos(2 * np.pi * dayofweek / 7),
+    ]).astype(np.float64)
+
+def history_features(values, ids=None):
+    # Lags and rolling stats for one or many stacked series (sorted by id, then date).
+    # Rolling windows come from differences of shifted cumulative sums, so the whole
+    # frame is processed in a handful of grouped passes without a per-series loop.
+    values = pd.Series(np.asarray(values, dtype=np.float64))
+    ids = pd.Series(np.zeros(len(values), dtype=np.int32) if ids is None else np.asarray(ids))
+    g = values.groupby(ids)
+    out = {f'lag_{lag}': g.shift(lag).values for lag in LAGS}
+    out['diff_1_7'] = out['lag_1'] - out['lag_7']
+
+    prev = g.shift(1).fillna(0)
+    csum = prev.groupby(ids).cumsum()
+    csq = (prev ** 2).groupby(ids).cumsum()
+    position = ids.groupby(ids).cumcount().values
+    for window in [7, 30]:
+        mean = (csum - csum.groupby(ids).shift(window).fillna(0)).values / window
+        out[f'rolling_mean_{window}'] = np.where(position >= window, mean, np.nan)
+        if window == 7:
+            sq = (csq - csq.groupby(ids).shift(window).fillna(0)).values
+            var = np.clip((sq - window * mean ** 2) / (window - 1), 0, None)
+            out['rolling_std_7'] = np.where(position >= window, np.sqrt(var), np.nan)
+    return out
+
+def build_features(df, target_col='Sales_clipped', group_col=None, date_col=None):
+    # Training matrix: original columns plus FEATURE_COLUMNS, rows without full history dropped
+    data = df.copy()
+    if group_col is not None:
+        data = data.sort_values([group_col, date_col]).reset_index(drop=True)
+    dates = data.index if date_col is None else data[date_col]
+    ids = data[group_col].values if group_col is not None else None
+
+    feats = pd.DataFrame(calendar_features(dates), columns=CALENDAR_FEATURES, index=data.index)
+    for name, col in history_features(data[target_col].values, ids).items():
+        feats[name] = col
+    data[FEATURE_COLUMNS] = feats[FEATURE_COLUMNS]
+    return data.dropna(subset=FEATURE_COLUMNS)
+
+def next_features(window, date):
+    # Incremental path: one feature row per series for `date`, given the most
+    # recent HISTORY_WINDOW target values (1-D for one series, 2-D for many)
+    window = np.atleast_2d(np.asarray(window, dtype=np.float64))[:, -HISTORY_WINDOW:]
+    X = np.empty((window.shape[0], len(FEATURE_COLUMNS)))
+    X[:, :len(CALENDAR_FEATURES)] = calendar_features([date])[0]
+    col = len(CALENDAR_FEATURES)
+    for lag in LAGS:
+        X[:, col] = window[:, -lag]
+        col += 1
+    X[:, col] = window[:, -1] - window[:, -7]
+    X[:, col + 1] = window[:, -7:].mean(axis=1)
+    X[:, col + 2] = window[:, -7:].std(axis=1, ddof=1)
+    X[:, col + 3] = window[:, -30:].mean(axis=1)
+    return X
+
+# Direct multi-horizon mode: one model, with the forecast horizon as an extra input
+DIRECT_FEATURE_COLUMNS = FEATURE_COLUMNS + ['horizon']
+
+def build_direct_features(df, horizon=30, target_col='Sales_clipped'):
+    # One row per (origin, horizon): history as known at the origin, calendar of the target day
+    values = df[target_col].values
+    dates = pd.DatetimeIndex(df.index)
+    hist = pd.DataFrame(history_features(values))[FEATURE_COLUMNS[len(CALENDAR_FEATURES):]].values
+    calendar = calendar_features(dates)
+    frames = []
+    for h in range(1, horizon + 1):
+        # Row p holds history up to day p-1, so its target h days ahead is row p+h-1
+        n = len(values) - h + 1
+        X = np.column_stack([calendar[h - 1:], hist[:n], np.full(n, h)])
+        frame = pd.DataFrame(X, columns=DIRECT_FEATURE_COLUMNS, index=dates[h - 1:])
+        frame['target'] = values[h - 1:]
+        frames.append(frame)
+    stacked = pd.concat(frames).dropna(subset=DIRECT_FEATURE_COLUMNS)
+    stacked.index.name = 'Date'
+    return stacked
+
+def direct_features(window, dates):
+    # Inference rows for every (series, horizon) pair, series-major, from the latest window
+    dates = pd.DatetimeIndex(dates)
+    history = next_features(window, dates[0])[:, len(CALENDAR_FEATURES):]
+    n_series, horizon = history.shape[0], len(dates)
+    X = np.empty((n_series * horizon, len(DIRECT_FEATURE_COLUMNS)))
+    X[:, :len(CALENDAR_FEATURES)] = np.tile(calendar_features(dates), (n_series, 1))
+    X[:, len(CALENDAR_FEATURES):-1] = np.repeat(history, horizon, axis=0)
+    X[:, -1] = np.tile(np.arange(1, horizon + 1), n_series)
+    return X
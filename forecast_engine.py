@@ -0,0 +1,89 @@
+import pandas as pd
+import numpy as np
+
+from features import CALENDAR_FEATURES, FEATURE_COLUMNS, HISTORY_WINDOW, LAGS, calendar_features
+
+class RecursiveForecaster:
+    # Recursive multi-step forecaster for many series at once.
+    #
+    # The last HISTORY_WINDOW values of every series live in a preallocated
+    # (series x window) ring buffer. Rolling sums are updated in O(1) per step
+    # and each step is a single in-place booster prediction on a reused array,
+    # so there is no per-step DataFrame construction or concat.
+
+    def __init__(self, model, history):
+        self.booster = model.get_booster() if hasattr(model, 'get_booster') else model
+        history = np.atleast_2d(np.asarray(history, dtype=np.float64))
+        if history.shape[1] < HISTORY_WINDOW:
+            raise ValueError(f"Need at least {HISTORY_WINDOW} days of history per series.")
+        self.n_series = history.shape[0]
+        self.buffer = np.array(history[:, -HISTORY_WINDOW:], order='C')
+        self.head = 0  # slot of the oldest value, overwritten next
+        self.sum_7 = self.buffer[:, -7:].sum(axis=1)
+        self.sumsq_7 = (self.buffer[:, -7:] ** 2).sum(axis=1)
+        self.sum_30 = self.buffer.sum(axis=1)
+        self.X = np.empty((self.n_series, len(FEATURE_COLUMNS)), dtype=np.float32)
+
+    def _lag(self, lag):
+        return self.buffer[:, (self.head - lag) % HISTORY_WINDOW]
+
+    def _fill_features(self, calendar_row):
+        X = self.X
+        X[:, :len(CALENDAR_FEATURES)] = calendar_row
+        col = len(CALENDAR_FEATURES)
+        for lag in LAGS:
+            X[:, col] = self._lag(lag)
+            col += 1
+        X[:, col] = self._lag(1) - self._lag(7)
+        mean_7 = self.sum_7 / 7
+        X[:, col + 1] = mean_7
+        X[:, col + 2] = np.sqrt(np.clip((self.sumsq_7 - 7 * mean_7 ** 2) / 6, 0, None))
+        X[:, col + 3] = self.sum_30 / HISTORY_WINDOW
+        return X
+
+    def _push(self, values):
+        # Slide both windows by one day without moving any data
+        leaving_7 = self._lag(7)
+        self.sum_7 += values - leaving_7
+        self.sumsq_7 += values ** 2 - leaving_7 ** 2
+        self.sum_30 += values - self.buffer[:, self.head]
+        self.buffer[:, self.head] = values
+        self.head = (self.head + 1) % HISTORY_WINDOW
+
+    def forecast(self, dates, noise=None):
+        # (series x horizon) array of non-negative predictions for `dates`; an optional
+        # (series x horizon) noise array is added to each step before it is fed back
+        dates = pd.DatetimeIndex(dates)
+        calendar = calendar_features(dates)
+        preds = np.empty((self.n_series, len(dates)))
+        for step in range(len(dates)):
+            X = self._fill_features(calendar[step])
+            step_pred = self.booster.inplace_predict(X).astype(np.float64)
+            if noise is not None:
+                step_pred += noise[:, step]
+            step_pred = np.maximum(step_pred, 0)
+            preds[:, step] = step_pred
+            self._push(step_pred)
+        return preds
+
+QUANTILES = {'P10': 10, 'P50': 50, 'P90': 90}
+
+def sample_paths(model, history, dates, residuals, n_paths=1000, seed=42):
+    # Monte Carlo: n_paths copies of one series' history advance together as rows of
+    # the ring buffer (one batched predict per step). Every step adds a one-step
+    # residual, and the noisy value feeds the next step's lags. `residuals` is an
+    # array, or a {dayofweek: array} mapping to draw each day from its own weekday.
+    rng = np.random.default_rng(seed)
+    dates = pd.DatetimeIndex(dates)
+    history = np.asarray(history, dtype=np.float64)[-HISTORY_WINDOW:]
+    engine = RecursiveForecaster(model, np.repeat(history[np.newaxis, :], n_paths, axis=0))
+    noise = np.empty((n_paths, len(dates)))
+    for step, dayofweek in enumerate(dates.dayofweek):
+        pool = residuals[dayofweek] if isinstance(residuals, dict) else residuals
+        noise[:, step] = rng.choice(np.asarray(pool, dtype=np.float64), size=n_paths)
+    return engine.forecast(dates, noise=noise)
+
+def path_quantiles(paths):
+    # {'P10': ..., 'P50': ..., 'P90': ...} per day from (paths x horizon) samples
+    values = np.percentile(paths, list(QUANTILES.values()), axis=0)
+    return dict(zip(QUANTILES, values))
@@ -0,0 +1,221 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from features import HISTORY_WINDOW
+from forecast_engine import RecursiveForecaster
+from model_store import load_model, manifest_path
+
+# Long-lived local forecast service.
+#
+#   POST /forecast  {"horizon": 30}                                      -> total daily sales
+#   POST /forecast  {"horizon": 14, "series": {"StockCode": "85123A", "Country": "France"}}
+#   GET  /health
+#
+# The model and the recent history are loaded once and kept in memory.
+# Concurrent requests are merged into micro-batches so that every batch costs one
+# vectorised predict per forecast day, and new artifacts are hot-swapped.
+
+PROCESSED_FILE = os.path.join('data', 'processed_daily_sales.csv')
+MODEL_PATH = os.path.join('models', 'sales_model.ubj')
+PANEL_FILE = os.path.join('data', 'processed_series_sales.parquet')
+GLOBAL_MODEL_PATH = os.path.join('models', 'global_series_model.ubj')
+MAX_HORIZON = 365
+
+def _mtime(path):
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+class Snapshot:
+    # Immutable view of everything needed to answer requests; replaced as a whole on reload
+
+    def __init__(self):
+        daily = pd.read_csv(PROCESSED_FILE, index_col='Date', parse_dates=['Date']).sort_index()
+        self.model, self.manifest = load_model(MODEL_PATH)
+        self.history = daily['Sales_clipped'].values[-HISTORY_WINDOW:].astype(np.float64)
+        self.last_date = daily.index[-1]
+        self.series_model, self.series_keys, self.series_rows = None, [], {}
+        self.series_history, self.series_last_date = None, None
+        if os.path.exists(GLOBAL_MODEL_PATH) and os.path.exists(PANEL_FILE):
+            self.series_model, manifest = load_model(GLOBAL_MODEL_PATH)
+            self.series_keys = manifest['keys']
+            panel = pd.read_parquet(PANEL_FILE).sort_values(['series_id', 'Date'])
+            series = panel.drop_duplicates('series_id').reset_index(drop=True)
+            self.series_history = panel['Sales_clipped'].values.reshape(len(series), -1)[:, -HISTORY_WINDOW:].astype(np.float64)
+            self.series_last_date = panel['Date'].max()
+            self.series_rows = {tuple(str(v) for v in row): i for i, row in enumerate(series[self.series_keys].values)}
+        watched = [PROCESSED_FILE, MODEL_PATH, manifest_path(MODEL_PATH), PANEL_FILE, GLOBAL_MODEL_PATH, manifest_path(GLOBAL_MODEL_PATH)]
+        self.versions = {p: _mtime(p) for p in watched}
+
+class ForecastService:
+    def __init__(self, max_batch=256, max_wait_ms=5, reload_interval=2.0):
+        self.snapshot = Snapshot()
+        self.requests = queue.Queue()
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.reload_interval = reload_interval
+        self.stats = {'requests': 0, 'batches': 0, 'reloads': 0}
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+        threading.Thread(target=self._watch_loop, daemon=True).start()
+
+    def submit(self, horizon, series=None):
+        if not 1 <= horizon <= MAX_HORIZON:
+            raise ValueError(f"horizon must be between 1 and {MAX_HORIZON}")
+        future = Future()
+        self.requests.put((horizon, series, future))
+        return future.result(timeout=60)
+
+    def _watch_loop(self):
+        # Zero-downtime reload: build the new snapshot off to the side, then swap the reference
+        while True:
+            time.sleep(self.reload_interval)
+            current = self.snapshot.versions
+            if all(_mtime(p) == v for p, v in current.items()):
+                continue
+            try:
+                self.snapshot = Snapshot()
+                self.stats['reloads'] += 1
+                print(f"--- Reloaded model artifacts at {time.strftime('%H:%M:%S')} ---")
+            except Exception as exc:
+                # A half-written artifact: keep serving the old snapshot and retry later
+                print(f"--- Reload skipped: {exc!r} ---")
+
+    def _batch_loop(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._run_batch(batch)
+            except Exception as exc:
+                # Never let the batch thread die: fail whatever is still unanswered
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+
+    def _run_batch(self, batch):
+        snap = self.snapshot
+        self.stats['requests'] += len(batch)
+        self.stats['batches'] += 1
+        total, by_series = [], {}
+        for request in batch:
+            horizon, series, future = request
+            # A bad request fails its own future; the batch thread keeps serving
+            try:
+                if series is None:
+                    total.append(request)
+                    continue
+                if snap.series_model is None:
+                    raise ValueError("No multi-series model loaded.")
+                key = tuple(str(series.get(k)) for k in snap.series_keys)
+                if key not in snap.series_rows:
+                    raise KeyError(f"Unknown series: {series}")
+                by_series.setdefault(snap.series_rows[key], []).append(request)
+            except Exception as exc:
+                future.set_exception(exc)
+
+        # One recursive pass per model; requests for the same series share one row
+        if total:
+            self._answer(snap.model, snap.history[None, :], [total], snap.last_date)
+        if by_series:
+            rows = sorted(by_series)
+            self._answer(snap.series_model, snap.series_history[rows], [by_series[r] for r in rows], snap.series_last_date)
+
+    def _answer(self, model, history, groups, last_date):
+        horizon = max(request[0] for group in groups for request in group)
+        dates = pd.date_range(last_date + pd.Timedelta(days=1), periods=horizon)
+        try:
+            preds = RecursiveForecaster(model, history).forecast(dates)
+        except Exception as exc:
+            # Server-side failure (XGBoostError is a ValueError): wrapped so the handler answers 500
+            error = RuntimeError(f"prediction failed: {exc!r}")
+            for group in groups:
+                for _, _, future in group:
+                    future.set_exception(error)
+            return
+        for row, group in enumerate(groups):
+            for request_horizon, _, future in group:
+                future.set_result({
+                    'dates': [d.strftime('%Y-%m-%d') for d in dates[:request_horizon]],
+                    'forecast': preds[row, :request_horizon].round(2).tolist(),
+                })
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != '/health':
+                return self._send(404, {'error': 'not found'})
+            snap = service.snapshot
+            self._send(200, {'status': 'ok', 'last_date': snap.last_date.strftime('%Y-%m-%d'),
+                             'series': len(snap.series_rows),
+                             'model_created': snap.manifest.get('created'), **service.stats})
+
+        def do_POST(self):
+            if self.path != '/forecast':
+                return self._send(404, {'error': 'not found'})
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                if not isinstance(payload, dict):
+                    raise ValueError("request body must be a JSON object")
+                series = payload.get('series')
+                if series is not None and not isinstance(series, dict):
+                    raise ValueError("series must be an object of key columns, e.g. {\"Country\": \"France\"}")
+                horizon = int(payload.get('horizon', 30))
+            except (ValueError, TypeError) as exc:
+                return self._send(400, {'error': str(exc)})
+            try:
+                result = service.submit(horizon, series)
+            except (ValueError, KeyError) as exc:
+                return self._send(400, {'error': str(exc)})
+            except FutureTimeout:
+                return self._send(504, {'error': 'forecast timed out'})
+            except Exception as exc:
+                return self._send(500, {'error': f"{type(exc).__name__}: {exc}"})
+            self._send(200, result)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+class ForecastServer(ThreadingHTTPServer):
+    # Bursts of concurrent clients are the point of micro-batching; don't drop their connections
+    request_queue_size = 1024
+    daemon_threads = True
+
+def serve(host='127.0.0.1', port=8765, max_batch=256, max_wait_ms=5):
+    service = ForecastService(max_batch=max_batch, max_wait_ms=max_wait_ms)
+    server = ForecastServer((host, port), make_handler(service))
+    print(f"--- Forecast service listening on http://{host}:{port} ---")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve forecasts over HTTP with micro-batching and hot reload.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-batch', type=int, default=256, help="Requests merged into one predict pass")
+    parser.add_argument('--max-wait-ms', type=float, default=5, help="How long a batch waits for more requests")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.max_batch, args.max_wait_ms)
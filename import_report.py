@@ -0,0 +1,74 @@
+import json
+import os
+import re
+import subprocess
+import sys
+
+# Import-time report for CI.
+#
+# Runs `python -X importtime` on the entry point (or on a full main.py invocation)
+# and prints the cumulative cost of every top-level import. Fails when one of the
+# heavy libraries is loaded or the total goes over budget, so lazy imports stay lazy.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ['pandas', 'numpy', 'matplotlib', 'seaborn', 'xgboost', 'sklearn', 'scipy', 'joblib', 'pyarrow']
+LINE_PATTERN = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+def measure(argv):
+    result = subprocess.run([sys.executable, '-X', 'importtime', *argv], cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        match = LINE_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({'module': name, 'depth': len(indent) // 2,
+                            'self_ms': int(self_us) / 1000, 'cumulative_ms': int(cumulative_us) / 1000})
+    return modules, result.returncode
+
+def build_report(modules, top=15):
+    top_level = sorted((m for m in modules if m['depth'] == 0), key=lambda m: -m['cumulative_ms'])
+    loaded = {m['module'] for m in modules}
+    return {
+        'total_ms': round(sum(m['cumulative_ms'] for m in top_level), 1),
+        'modules': len(modules),
+        'heavy_loaded': [name for name in HEAVY_MODULES if name in loaded],
+        'top': [{'module': m['module'], 'cumulative_ms': round(m['cumulative_ms'], 1)} for m in top_level[:top]],
+    }
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Per-module import-time report for the pipeline entry point.")
+    parser.add_argument('--module', default='main', help="Module whose import is measured (default: main)")
+    parser.add_argument('--run', nargs=argparse.REMAINDER, metavar='ARGS',
+                        help="Measure a whole main.py invocation instead (last option), e.g. --run --check")
+    parser.add_argument('--top', type=int, default=15, help="Top-level imports to list")
+    parser.add_argument('--max-ms', type=float, help="Fail when the total import time exceeds this budget")
+    parser.add_argument('--allow-heavy', action='store_true', help="Do not fail when heavy libraries are imported")
+    parser.add_argument('--json', metavar='PATH', help="Also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    target = ['main.py', *args.run] if args.run is not None else ['-c', f'import {args.module}']
+    modules, returncode = measure(target)
+    report = {'target': ' '.join(target), 'returncode': returncode, **build_report(modules, args.top)}
+
+    print(f"--- Import report for: python {report['target']} ---")
+    for entry in report['top']:
+        print(f"{entry['cumulative_ms']:>9.1f} ms  {entry['module']}")
+    print(f"--- {report['modules']} modules, {report['total_ms']:.1f} ms total ---")
+
+    failures = []
+    if report['heavy_loaded'] and not args.allow_heavy:
+        failures.append(f"heavy libraries imported: {', '.join(report['heavy_loaded'])}")
+    if args.max_ms is not None and report['total_ms'] > args.max_ms:
+        failures.append(f"import time {report['total_ms']:.1f} ms exceeds the {args.max_ms:.0f} ms budget")
+    report['failures'] = failures
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
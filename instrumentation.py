@@ -0,0 +1,254 @@
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from functools import wraps
+
+# Lightweight stage / sub-step instrumentation (stdlib only).
+#
+#   @instrumented('train')                  # a whole stage
+#   with span('search', rows=n):            # a sub-step, recorded as train/search
+#       ...
+#   annotate(rows=len(df))                  # add fields to the innermost span
+#
+# Every finished span is appended as one JSON line to data/metrics.jsonl with
+# wall time, CPU time, peak RSS and row counts.
+#
+# The RSS high-water mark (and the tracemalloc peak) is process-wide, so it is
+# only reset when the outermost span of the process opens. A nested span
+# reports the peak since its outermost span began (rss_scope 'enclosing'), and
+# a span that overlaps spans of another thread (e.g. concurrent dashboard
+# sessions) reports no peak at all (rss_scope 'shared'). Environment settings:
+#   FORECAST_METRICS=0                 disable the instrumentation
+#   FORECAST_METRICS_FILE=path         JSON lines output (default data/metrics.jsonl)
+#   FORECAST_PROMETHEUS_FILE=path      also keep a Prometheus text-format file up to date
+#   FORECAST_TRACEMALLOC=1             also record the Python heap peak (slower)
+
+METRICS_FILE = os.path.join('data', 'metrics.jsonl')
+PROMETHEUS_METRICS = {
+    'wall_s': ('forecast_span_wall_seconds', 'Wall-clock time of the span', 1),
+    'cpu_s': ('forecast_span_cpu_seconds', 'CPU time of the process during the span', 1),
+    'peak_rss_mb': ('forecast_span_peak_rss_bytes', 'Peak resident memory during the span', 1024 * 1024),
+    'tracemalloc_peak_mb': ('forecast_span_tracemalloc_peak_bytes', 'Peak traced Python heap during the span', 1024 * 1024),
+    'rows': ('forecast_span_rows', 'Rows processed by the span', 1),
+    'ts': ('forecast_span_last_run_timestamp_seconds', 'Unix time the span last finished', 1),
+}
+
+_local = threading.local()
+_lock = threading.Lock()
+_latest = {}
+_open = []   # spans currently open in any thread of the process
+
+def enabled():
+    return os.environ.get('FORECAST_METRICS', '1') != '0'
+
+def run_id():
+    # Shared by every process of one pipeline run (children inherit the environment)
+    if 'FORECAST_RUN_ID' not in os.environ:
+        os.environ['FORECAST_RUN_ID'] = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+    return os.environ['FORECAST_RUN_ID']
+
+def _proc_status(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def _reset_peak_rss():
+    # Linux lets a process reset its own RSS high-water mark; elsewhere the peak is process-wide
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def _peak_rss_mb():
+    peak = _proc_status('VmHWM:')
+    if peak is not None:
+        return peak
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _tracemalloc():
+    if os.environ.get('FORECAST_TRACEMALLOC') != '1':
+        return None
+    import tracemalloc
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return tracemalloc
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+class span:
+    # Context manager measuring one named step. Nested spans are named parent/child.
+
+    def __init__(self, name, emit=True, **fields):
+        self.name = name
+        self.emit = emit
+        self.fields = dict(fields)
+        self.record = None
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        if not enabled():
+            return self
+        stack = _stack()
+        self.path = f"{stack[-1].path}/{self.name}" if stack else self.name
+        self.thread = threading.get_ident()
+        self.shared = False
+        self.tracer = _tracemalloc()
+        with _lock:
+            outermost = not _open
+            if any(other.thread != self.thread for other in _open):
+                # Another thread is being measured: neither span's peak is its own
+                self.shared = True
+                for other in _open:
+                    other.shared = True
+            _open.append(self)
+        if outermost:
+            self.rss_scope = 'span' if _reset_peak_rss() else 'process'
+            if self.tracer:
+                self.tracer.reset_peak()
+        else:
+            self.rss_scope = 'enclosing'
+        stack.append(self)
+        self.wall_start, self.cpu_start = time.perf_counter(), time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not enabled():
+            return False
+        wall_s, cpu_s = time.perf_counter() - self.wall_start, time.process_time() - self.cpu_start
+        stack = _stack()
+        stack.remove(self)
+        with _lock:
+            _open.remove(self)
+        peak_rss, traced_peak = None, None
+        if self.shared:
+            self.rss_scope = 'shared'
+        else:
+            peak_rss = round(_peak_rss_mb() or 0, 2)
+            if self.tracer:
+                traced_peak = self.tracer.get_traced_memory()[1] / (1024 * 1024)
+        self.record = {
+            'ts': time.time(),
+            'run_id': run_id(),
+            'pid': os.getpid(),
+            'span': self.path,
+            'stage': self.path.split('/')[0],
+            'status': 'error' if exc_type else 'ok',
+            'wall_s': round(wall_s, 6),
+            'cpu_s': round(cpu_s, 6),
+            'peak_rss_mb': peak_rss,
+            'rss_mb': _proc_status('VmRSS:'),
+            'rss_scope': self.rss_scope,
+            'tracemalloc_peak_mb': round(traced_peak, 2) if traced_peak is not None else None,
+            **self.fields,
+        }
+        if self.emit:
+            record(self.record, flush_prometheus=not stack)
+        return False
+
+def instrumented(name):
+    # Decorator form of span() for whole stages
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def annotate(**fields):
+    stack = _stack()
+    if stack:
+        stack[-1].set(**fields)
+
+def record(entry, flush_prometheus=True):
+    # Append a finished span (also used for spans measured in worker processes)
+    if not enabled() or entry is None:
+        return
+    path = os.environ.get('FORECAST_METRICS_FILE', METRICS_FILE)
+    line = json.dumps(entry, default=str) + '\n'
+    with _lock:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'a') as f:
+            f.write(line)
+        _latest[entry['span']] = entry
+        prometheus_file = os.environ.get('FORECAST_PROMETHEUS_FILE')
+        if prometheus_file and flush_prometheus:
+            write_prometheus(prometheus_file, _latest.values())
+
+def _parse_prometheus(path):
+    samples = {}
+    if not os.path.exists(path):
+        return samples
+    with open(path) as f:
+        for line in f:
+            if line.startswith('#') or '{' not in line:
+                continue
+            key, value = line.rsplit(' ', 1)
+            samples[key] = value.strip()
+    return samples
+
+def write_prometheus(path, entries):
+    # Text format for the node_exporter textfile collector; spans from earlier
+    # processes stay in the file until they are measured again
+    samples = _parse_prometheus(path)
+    for entry in entries:
+        labels = f'span="{entry["span"]}",stage="{entry["stage"]}"'
+        for field, (metric, _, scale) in PROMETHEUS_METRICS.items():
+            if entry.get(field) is not None:
+                samples[f"{metric}{{{labels}}}"] = repr(float(entry[field]) * scale)
+    lines = []
+    for field, (metric, help_text, _) in PROMETHEUS_METRICS.items():
+        metric_samples = sorted((k, v) for k, v in samples.items() if k.startswith(metric + '{'))
+        if metric_samples:
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+            lines += [f"{k} {v}" for k, v in metric_samples]
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(path + '.tmp', path)
+
+def load_records(path=METRICS_FILE, run=None):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if run == 'last' and records:
+        run = records[-1]['run_id']
+    return [r for r in records if run is None or r['run_id'] == run]
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Summarise the recorded stage metrics.")
+    parser.add_argument('--file', default=os.environ.get('FORECAST_METRICS_FILE', METRICS_FILE), help="JSON lines metrics file")
+    parser.add_argument('--run', default='last', help="Run id to show ('last' by default, 'all' for every run)")
+    parser.add_argument('--prometheus', metavar='PATH', help="Write the selected spans as a Prometheus text file")
+    args = parser.parse_args()
+    records = load_records(args.file, None if args.run == 'all' else args.run)
+    if not records:
+        print(f"No metrics recorded in {args.file}.")
+        sys.exit(0)
+    print(f"--- {len(records)} span(s) from run {records[-1]['run_id']} ---")
+    print(f"{'span':<40} {'wall s':>9} {'cpu s':>9} {'peak MB':>9} {'rows':>12}")
+    for r in records:
+        rows = f"{r['rows']:,}" if isinstance(r.get('rows'), int) else ''
+        peak = f"{r['peak_rss_mb']:.1f}" if r.get('peak_rss_mb') is not None else '-'
+        print(f"{r['span']:<40} {r['wall_s']:>9.3f} {r['cpu_s']:>9.3f} {peak:>9} {rows:>12}")
+    if args.prometheus:
+        write_prometheus(args.prometheus, records)
+        print(f"--- Prometheus metrics written to {args.prometheus} ---")
@@ -0,0 +1,243 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+# Local background job runner for pipeline runs started from the dashboard.
+#
+# Each job runs main.py inside its own staging workspace (jobs/<id>/workspace),
+# so the dashboard keeps serving the current artifacts while it works. Only
+# when the run succeeds are the new artifacts published: every changed file is
+# first staged under a hidden name, then renamed into place with os.replace,
+# payload files before the index files that name them (model and Power BI
+# manifests, pipeline state), and finally the files the job deleted are
+# removed. Failed workspaces are discarded. At most one job runs at a time.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+JOBS_FOLDER = os.path.join(ROOT, 'jobs')
+LOCK_FILE = os.path.join(JOBS_FOLDER, 'active.lock')
+ARTIFACT_FOLDERS = ['data', 'models', 'plots']
+SHARED_FOLDERS = ['raw_data', os.path.join('data', 'cache')]
+STEP_PATTERN = re.compile(r'^Step (\d+): (.*)$')
+# Published last: they reference the files next to them
+INDEX_FILES = ('.manifest.json', '_manifest.json', 'pipeline_state.json')
+
+def _job_dir(job_id):
+    return os.path.join(JOBS_FOLDER, job_id)
+
+def _write_status(job_id, status):
+    path = os.path.join(_job_dir(job_id), 'status.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(status, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+def job_status(job_id):
+    path = os.path.join(_job_dir(job_id), 'status.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def latest_job():
+    if not os.path.isdir(JOBS_FOLDER):
+        return None
+    ids = sorted(d for d in os.listdir(JOBS_FOLDER) if os.path.isdir(_job_dir(d)))
+    return job_status(ids[-1]) if ids else None
+
+def read_log(job_id, tail=40):
+    path = os.path.join(_job_dir(job_id), 'pipeline.log')
+    if not os.path.exists(path):
+        return ''
+    with open(path, errors='replace') as f:
+        return ''.join(f.readlines()[-tail:])
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except (OSError, TypeError):
+        return False
+    return True
+
+def _write_lock(job_id, pid, claim=False):
+    # The lock only ever appears complete: it is written to a private temp file,
+    # then hard-linked into place to claim it (fails if a lock exists) or
+    # renamed over it to hand it over
+    tmp = f"{LOCK_FILE}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump({'job_id': job_id, 'pid': pid}, f)
+    try:
+        if claim:
+            os.link(tmp, LOCK_FILE)
+        else:
+            os.replace(tmp, LOCK_FILE)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def active_job():
+    # The running job, clearing the lock if its supervisor died
+    try:
+        with open(LOCK_FILE) as f:
+            lock = json.load(f)
+    except FileNotFoundError:
+        return None
+    if _pid_alive(lock.get('pid')):
+        return job_status(lock['job_id'])
+    os.remove(LOCK_FILE)
+    return None
+
+def start_job(args=('--refresh',)):
+    # Returns (job_id, started); an already running job is returned instead of a second one
+    os.makedirs(JOBS_FOLDER, exist_ok=True)
+    running = active_job()
+    if running:
+        return running['id'], False
+    # Sub-second suffix: a retry within the same second gets its own (still sortable) id
+    job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}"
+    os.makedirs(_job_dir(job_id), exist_ok=True)
+    _write_status(job_id, {'id': job_id, 'state': 'queued', 'args': list(args), 'stages': [],
+                           'created': time.strftime('%Y-%m-%d %H:%M:%S')})
+    try:
+        # The exclusive link makes the lock itself the single-run guarantee
+        _write_lock(job_id, os.getpid(), claim=True)
+    except FileExistsError:
+        shutil.rmtree(_job_dir(job_id), ignore_errors=True)
+        running = active_job()
+        return (running['id'], False) if running else start_job(args)
+    supervisor = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--supervise', job_id],
+                                  cwd=ROOT, start_new_session=True,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # Hand the lock over to the supervisor, which releases it when done
+    _write_lock(job_id, supervisor.pid)
+    return job_id, True
+
+def _artifact_files(root):
+    # Relative paths of the artifact files under root (caches and linked shared folders excluded)
+    files = set()
+    for folder in ARTIFACT_FOLDERS:
+        for dirpath, dirnames, filenames in os.walk(os.path.join(root, folder)):
+            dirnames[:] = [d for d in dirnames if d != 'cache' and not os.path.islink(os.path.join(dirpath, d))]
+            files.update(os.path.relpath(os.path.join(dirpath, name), root) for name in filenames)
+    return files
+
+def _baseline_file(workspace):
+    return os.path.join(os.path.dirname(workspace), 'baseline.json')
+
+def _prepare_workspace(workspace):
+    # Copy the live artifacts, link code and large read-only inputs
+    os.makedirs(workspace, exist_ok=True)
+    for name in os.listdir(ROOT):
+        if name.endswith('.py'):
+            os.symlink(os.path.join(ROOT, name), os.path.join(workspace, name))
+    for folder in ARTIFACT_FOLDERS:
+        src = os.path.join(ROOT, folder)
+        if os.path.isdir(src):
+            shutil.copytree(src, os.path.join(workspace, folder),
+                            ignore=shutil.ignore_patterns('cache'))
+    for folder in SHARED_FOLDERS:
+        src = os.path.join(ROOT, folder)
+        if os.path.isdir(src):
+            os.makedirs(os.path.dirname(os.path.join(workspace, folder)), exist_ok=True)
+            os.symlink(src, os.path.join(workspace, folder))
+    # What the job started from, so files it deletes can be deleted from the live tree too
+    with open(_baseline_file(workspace), 'w') as f:
+        json.dump(sorted(_artifact_files(workspace)), f)
+
+def _incoming(dst):
+    # Hidden staging name next to the target: same filesystem, skipped by folder readers
+    return os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.incoming")
+
+def _swap_artifacts(workspace):
+    # Returns (files published, files removed)
+    with open(_baseline_file(workspace)) as f:
+        baseline = set(json.load(f))
+    current = _artifact_files(workspace)
+
+    # 1. Stage every new or changed file; nothing is visible yet
+    changed = []
+    for rel in sorted(current):
+        src, dst = os.path.join(workspace, rel), os.path.join(ROOT, rel)
+        if os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(src) \
+                and os.path.getsize(dst) == os.path.getsize(src):
+            continue
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copy2(src, _incoming(dst))
+        changed.append(rel)
+
+    # 2. Rename into place, payload first and index files last, so an index never names a missing file
+    for rel in sorted(changed, key=lambda rel: rel.endswith(INDEX_FILES)):
+        dst = os.path.join(ROOT, rel)
+        os.replace(_incoming(dst), dst)
+
+    # 3. Mirror deletions (e.g. Power BI months no longer listed in the new manifest)
+    removed = 0
+    for rel in sorted(baseline - current):
+        dst = os.path.join(ROOT, rel)
+        if not os.path.exists(dst):
+            continue
+        os.remove(dst)
+        removed += 1
+        parent = os.path.dirname(dst)
+        while os.path.relpath(parent, ROOT) not in ARTIFACT_FOLDERS and not os.listdir(parent):
+            os.rmdir(parent)
+            parent = os.path.dirname(parent)
+    return len(changed), removed
+
+def supervise(job_id):
+    status = job_status(job_id)
+    workspace = os.path.join(_job_dir(job_id), 'workspace')
+    status.update(state='running', started=time.strftime('%Y-%m-%d %H:%M:%S'), pid=os.getpid())
+    _write_status(job_id, status)
+    try:
+        _prepare_workspace(workspace)
+        with open(os.path.join(_job_dir(job_id), 'pipeline.log'), 'w') as log:
+            proc = subprocess.Popen([sys.executable, '-u', 'main.py', *status['args']], cwd=workspace,
+                                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+            for line in proc.stdout:
+                log.write(line)
+                log.flush()
+                match = STEP_PATTERN.match(line.strip())
+                if match:
+                    # Per-stage progress: the previous stage is done once the next one starts
+                    for stage in status['stages']:
+                        stage['status'] = 'done'
+                    status['stages'].append({'step': int(match.group(1)), 'name': match.group(2), 'status': 'running'})
+                    _write_status(job_id, status)
+            returncode = proc.wait()
+        status['returncode'] = returncode
+        if returncode == 0:
+            for stage in status['stages']:
+                stage['status'] = 'done'
+            status['swapped_files'], status['removed_files'] = _swap_artifacts(workspace)
+            status['state'] = 'succeeded'
+        else:
+            status['state'] = 'failed'
+    except Exception as exc:
+        status.update(state='failed', error=repr(exc))
+    finally:
+        # The log and status stay in jobs/<id>/; the workspace copy is never needed again
+        shutil.rmtree(workspace, ignore_errors=True)
+        if os.path.exists(_baseline_file(workspace)):
+            os.remove(_baseline_file(workspace))
+        status['finished'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        _write_status(job_id, status)
+        if os.path.exists(LOCK_FILE):
+            os.remove(LOCK_FILE)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Background pipeline job runner.")
+    parser.add_argument('--supervise', metavar='JOB_ID', help=argparse.SUPPRESS)
+    parser.add_argument('--start', action='store_true', help="Start a background pipeline run (main.py --refresh)")
+    parser.add_argument('--status', action='store_true', help="Show the latest job")
+    args = parser.parse_args()
+    if args.supervise:
+        supervise(args.supervise)
+    elif args.start:
+        job_id, started = start_job()
+        print(f"{'Started' if started else 'Already running'}: job {job_id}")
+    else:
+        print(json.dumps(latest_job(), indent=2))
@@ -1,13 +1,67 @@
+import argparse
 import os
 import sys
 import time
 
-# Import functions from our modular scripts
-from preprocess_data import preprocess
-from sales_forecasting import train_model
-from predict_future import generate_forecast
+# Only the stdlib-only DAG helpers are imported up front. Each stage imports its
+# module (pandas, xgboost, sklearn, matplotlib, ...) when it actually runs, so a
+# run where everything is up to date never loads them.
+from model_store import artifact_paths, manifest_path
+from pipeline import Stage, parse_duration, run_pipeline
+from render_plots import plot_paths
 
-def main():
+def run_preprocessing(args):
+    from preprocess_data import preprocess
+    preprocess(source=args.stream, stream=args.stream is not None, chunksize=args.chunksize,
+               incremental=args.incremental and not args.refresh, stock_codes=args.cube_stockcodes)
+
+def run_training(args, search_budget):
+    from sales_forecasting import train_model
+    # --refresh always means a full search
+    mode = 'full' if args.refresh else args.train_mode
+    train_model(strategy=args.strategy, search=args.search, search_budget=search_budget, mode=mode, drift_threshold=args.drift_threshold, cores=args.cores)
+
+def run_forecast(args):
+    from predict_future import generate_forecast
+    generate_forecast(strategy=args.strategy, powerbi_format=args.powerbi_format, paths=args.paths, cores=args.cores)
+
+def run_backtest(args):
+    from backtest import run_backtest
+    run_backtest(cores=args.cores)
+
+def run_plots(args):
+    from render_plots import render_plots
+    render_plots(profile=args.plots, cores=args.cores)
+
+def run_multi_series(args):
+    from multi_series import prepare_series_panel, train_global_model, generate_series_forecast
+    prepare_series_panel(keys=args.series_keys, source=args.stream, stream=args.stream is not None, chunksize=args.chunksize)
+    train_global_model(cores=args.cores)
+    generate_series_forecast(cores=args.cores)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the sales forecasting pipeline.")
+    parser.add_argument('--refresh', action='store_true', help="Rebuild every stage even if its inputs are unchanged")
+    parser.add_argument('--stream', metavar='PATH', help="Preprocess a CSV/Parquet transaction export in bounded-memory chunks")
+    parser.add_argument('--chunksize', type=int, default=500_000, help="Rows per chunk when streaming")
+    parser.add_argument('--strategy', choices=['recursive', 'direct'], default='recursive', help="Forecast recursively day by day, or the whole horizon at once with the direct model")
+    parser.add_argument('--search', choices=['random', 'halving'], default='random', help="Hyperparameter search: full randomized search or successive halving with early stopping")
+    parser.add_argument('--search-budget', metavar='DURATION', help="Time budget for the search, e.g. 60s or 5m (implies --search halving)")
+    parser.add_argument('--train-mode', choices=['auto', 'update', 'full'], default='auto', help="auto: continue boosting the stored model on new days, with a full search weekly or on drift; update: search only when no usable stored model exists; full: always search")
+    parser.add_argument('--drift-threshold', type=float, default=0.2, help="Relative hold-out MAE increase over the last full search that triggers a new search")
+    parser.add_argument('--plots', choices=['full', 'preview', 'vector', 'none'], default='full', help="Plot profile: 300 DPI PNGs, fast 72 DPI previews, SVGs, or skip rendering")
+    parser.add_argument('--powerbi-format', choices=['parquet', 'csv', 'both'], default='both', help="Power BI export: month-partitioned Parquet dataset (incremental), legacy CSV, or both")
+    parser.add_argument('--series-keys', nargs='+', metavar='KEY', help="Also forecast every series keyed by these columns (e.g. StockCode Country) with one global model")
+    parser.add_argument('--incremental', action='store_true', help="Only aggregate transactions newer than the last processed InvoiceDate")
+    parser.add_argument('--paths', type=int, default=1000, help="Monte Carlo sample paths behind the forecast's P10/P50/P90 intervals (0 to skip)")
+    parser.add_argument('--backtest', action='store_true', help="Also run the rolling-origin backtest (weekly origins over the last year, in parallel)")
+    parser.add_argument('--cube-stockcodes', action='store_true', help="Also break the sales cube (data/sales_cube.parquet) down by StockCode")
+    parser.add_argument('--cores', type=int, help="CPU budget for training, backtest and plotting (default: $FORECAST_CORES or all cores); results do not depend on it")
+    parser.add_argument('--check', action='store_true', help="Only report stale stages (exit code 1 if any) without running them")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
     print("====================================================")
     print("--- WELCOME TO THE ULTIMATE SALES FORECASTING SYSTEM ---")
     print("====================================================")
@@ -16,37 +70,79 @@ def main():
 
     # Paths
     PROCESSED_FILE = os.path.join('data', 'processed_daily_sales.csv')
-    MODEL_PATH = os.path.join('models', 'sales_model.joblib')
+    MODEL_PATH = os.path.join('models', 'sales_model.ubj')
+    DIRECT_MODEL_PATH = os.path.join('models', 'sales_model_direct.ubj')
     RAW_DATA = os.path.join('raw_data', 'Online Retail.xlsx')
+    REGIONAL_FILE = os.path.join('data', 'regional_sales.csv')
+    CUBE_FILE = os.path.join('data', 'sales_cube.parquet')
+    VALIDATION_FILE = os.path.join('data', 'validation_results.csv')
+    REPORT_FILE = os.path.join('data', 'powerbi_master_report.csv')
+    REPORT_DATASET = os.path.join('data', 'powerbi', '_manifest.json')
+    SERIES_FORECAST_FILE = os.path.join('data', 'series_forecast.csv')
+    FORECAST_FILE = os.path.join('data', 'forecast.csv')
+    BACKTEST_FILE = os.path.join('data', 'backtest_results.csv')
 
-    # Check for force flag
-    force_refresh = "--refresh" in sys.argv
+    # Pipeline DAG: each stage reruns only when its inputs, code or params change
+    raw_input = args.stream or RAW_DATA
+    search_budget = parse_duration(args.search_budget) if args.search_budget else None
+    model_outputs = artifact_paths(MODEL_PATH) + (artifact_paths(DIRECT_MODEL_PATH) if args.strategy == 'direct' else [])
+    feature_code = ['features.py', 'forecast_engine.py']
+    report_outputs = ([REPORT_DATASET] if args.powerbi_format != 'csv' else []) + ([REPORT_FILE] if args.powerbi_format != 'parquet' else [])
 
-    # 1. PREPROCESSING
-    if not os.path.exists(PROCESSED_FILE) or force_refresh:
-        print("\nStep 1: Raw Data detected. Starting Preprocessing...")
-        preprocess()
-    else:
-        print("\nStep 1: Preprocessed data already exists. Skipping...")
+    stages = [
+        Stage('Preprocessing',
+              lambda: run_preprocessing(args),
+              inputs=[raw_input], outputs=[PROCESSED_FILE, REGIONAL_FILE], optional_outputs=[CUBE_FILE],
+              code=['preprocess_data.py', 'sales_cube.py'], params={'cube_stockcodes': args.cube_stockcodes}),
+        Stage('Training',
+              lambda: run_training(args, search_budget),
+              inputs=[PROCESSED_FILE], outputs=model_outputs + [VALIDATION_FILE],
+              code=['sales_forecasting.py', 'model_search.py', 'model_store.py'] + feature_code,
+              params={'strategy': args.strategy, 'search': args.search, 'search_budget': search_budget,
+                      'train_mode': args.train_mode, 'drift_threshold': args.drift_threshold}),
+    ]
+    if args.backtest:
+        # Refits from every origin with the trained model's hyperparameters; its errors
+        # also feed the forecast's Monte Carlo intervals, so it runs first
+        stages.append(Stage('Backtest',
+                            lambda: run_backtest(args),
+                            inputs=[PROCESSED_FILE, manifest_path(MODEL_PATH)], outputs=[BACKTEST_FILE],
+                            code=['backtest.py'] + feature_code))
+    # load_residuals reads backtest results whenever they exist, not just after --backtest
+    residual_inputs = [VALIDATION_FILE] + ([BACKTEST_FILE] if args.backtest or os.path.exists(BACKTEST_FILE) else [])
+    stages.append(Stage('30-Day Forecast',
+                        lambda: run_forecast(args),
+                        inputs=[PROCESSED_FILE] + model_outputs + residual_inputs, outputs=[FORECAST_FILE] + report_outputs,
+                        code=['predict_future.py', 'model_store.py', 'powerbi_dataset.py'] + feature_code,
+                        params={'strategy': args.strategy, 'powerbi_format': args.powerbi_format, 'paths': args.paths}))
+    if args.plots != 'none':
+        # Per-plot input hashes inside render_plots skip plots that would look the same
+        stages.append(Stage('Plot Rendering',
+                            lambda: run_plots(args),
+                            inputs=[PROCESSED_FILE, FORECAST_FILE], outputs=plot_paths(args.plots),
+                            code=['render_plots.py'], params={'profile': args.plots}))
+    if args.series_keys:
+        stages.append(Stage('Multi-Series Forecast',
+                            lambda: run_multi_series(args),
+                            inputs=[raw_input], outputs=[SERIES_FORECAST_FILE],
+                            code=['multi_series.py', 'preprocess_data.py', 'model_store.py'] + feature_code,
+                            params={'keys': args.series_keys}))
 
-    # 2. TRAINING
-    if not os.path.exists(MODEL_PATH) or force_refresh:
-        print("\nStep 2: Training the Machine Learning Model...")
-        train_model()
-    else:
-        print("\nStep 2: Trained model already exists. Skipping retrain...")
+    if args.check:
+        stale = run_pipeline(stages, force=args.refresh, check=True)
+        print(f"\n--- {len(stale)} stale stage(s){': ' + ', '.join(stale) if stale else ''} ({time.time() - start_time:.2f} seconds) ---")
+        return 1 if stale else 0
 
-    # 3. PREDICTION
-    print("\nStep 3: Generating Final 30-Day Forecast...")
-    generate_forecast()
+    run_pipeline(stages, force=args.refresh)
 
     end_time = time.time()
     print("\n====================================================")
     print(f"DONE! MISSION COMPLETE! Total Time: {end_time - start_time:.2f} seconds.")
-    print("7 ANALYTICAL FORECAST GRAPHS GENERATED!")
-    print("Check the 'plots/' folder for files 1 to 7.")
+    if args.plots != 'none':
+        print("7 ANALYTICAL FORECAST GRAPHS READY!")
+        print("Check the 'plots/' folder for files 1 to 7.")
     print("====================================================")
-    print("\nTIP: Run 'python main.py --refresh' if your Excel data changes!")
+    print("\nTIP: Data, code and setting changes are picked up automatically. Use 'python main.py --refresh' to force a full rebuild!")
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
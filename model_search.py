@@ -0,0 +1,91 @@
+import numpy as np
+import time
+from joblib import Parallel, delayed
+from xgboost import XGBRegressor
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import ParameterSampler, TimeSeriesSplit
+
+from model_store import load_manifest
+
+PARAM_GRID = {
+    'n_estimators': [500, 1000],
+    'learning_rate': [0.01, 0.05, 0.1],
+    'max_depth': [3, 5, 7],
+    'subsample': [0.8, 1.0],
+    'colsample_bytree': [0.8, 1.0]
+}
+
+def previous_best_params(model_path, param_grid=PARAM_GRID):
+    # Warm start: the hyperparameters stored with the last trained model, if any
+    manifest = load_manifest(model_path)
+    if manifest is None:
+        return None
+    params = manifest['params']
+    best = {k: params[k] for k in param_grid if params.get(k) is not None}
+    # The stored tree count was picked by early stopping; let it be re-learned
+    best['n_estimators'] = max(param_grid['n_estimators'])
+    return best
+
+def _score_fold(params, X, y, train_idx, val_idx, max_trees, early_stopping_rounds, random_state, nthread):
+    # (fold MAE, trees kept by early stopping on the fold's validation slice)
+    model = XGBRegressor(objective='reg:squarederror', random_state=random_state, n_jobs=nthread,
+                         early_stopping_rounds=early_stopping_rounds,
+                         **{**params, 'n_estimators': min(params['n_estimators'], max_trees)})
+    model.fit(X.iloc[train_idx], y.iloc[train_idx],
+              eval_set=[(X.iloc[val_idx], y.iloc[val_idx])], verbose=False)
+    return mean_absolute_error(y.iloc[val_idx], model.predict(X.iloc[val_idx])), model.best_iteration + 1
+
+def _score_candidate(params, X, y, folds, max_trees, early_stopping_rounds, random_state, nthread, n_jobs):
+    # Mean fold MAE; the folds run side by side in threads (XGBoost releases the GIL)
+    results = Parallel(n_jobs=n_jobs, prefer='threads')(
+        delayed(_score_fold)(params, X, y, train_idx, val_idx, max_trees, early_stopping_rounds, random_state, nthread)
+        for train_idx, val_idx in folds)
+    scores, best_trees = zip(*results)
+    return float(np.mean(scores)), int(np.ceil(np.mean(best_trees)))
+
+def halving_search(X, y, param_grid=PARAM_GRID, n_candidates=20, n_splits=5, eta=3,
+                   min_trees=100, budget_s=None, warm_start=None, early_stopping_rounds=50,
+                   random_state=42, nthread=None, n_jobs=1):
+    # Successive halving: every candidate gets a small tree budget, only the best
+    # 1/eta survive to the next rung with eta times more trees. The search stops
+    # early when the time budget runs out and keeps the best fully-ranked rung.
+    # n_jobs folds run at once with nthread XGBoost threads each.
+    start = time.time()
+    candidates = list(ParameterSampler(param_grid, n_iter=n_candidates, random_state=random_state))
+    if warm_start:
+        candidates = [c for c in candidates if c != warm_start]
+        candidates.insert(0, warm_start)
+    folds = list(TimeSeriesSplit(n_splits=n_splits).split(X))
+    max_trees = max(param_grid['n_estimators'])
+
+    best = None
+    trees, rung = min_trees, 0
+    while candidates:
+        results = []
+        for params in candidates:
+            if budget_s is not None and time.time() - start > budget_s and (results or best):
+                print(f"--- Search budget of {budget_s:.0f}s exhausted in rung {rung} ---")
+                candidates = []
+                break
+            score, n_trees = _score_candidate(params, X, y, folds, trees, early_stopping_rounds, random_state, nthread, n_jobs)
+            results.append((score, n_trees, params))
+        if not results:
+            break
+        results.sort(key=lambda r: r[0])
+        if best is None or len(results) == len(candidates) or results[0][0] < best[0]:
+            best = results[0]
+        print(f"--- Rung {rung}: {len(results)} candidate(s) at <= {trees} trees, best MAE {results[0][0]:,.2f} ---")
+        survivors = [params for _, _, params in results[:max(1, len(results) // eta)]]
+        if not candidates or trees >= max_trees or len(survivors) == 1:
+            break
+        candidates = survivors
+        trees, rung = min(trees * eta, max_trees), rung + 1
+
+    score, n_trees, params = best
+    best_params = {**params, 'n_estimators': max(n_trees, 1)}
+    # The final refit is a single fit and gets the whole share
+    best_model = XGBRegressor(objective='reg:squarederror', random_state=random_state,
+                              n_jobs=nthread * n_jobs if nthread else None, **best_params)
+    best_model.fit(X, y)
+    print(f"--- Halving search finished in {time.time() - start:.1f}s (CV MAE {score:,.2f}) ---")
+    return best_model, best_params
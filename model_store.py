@@ -0,0 +1,93 @@
+import json
+import os
+import time
+
+# Native model artifacts.
+#
+# A model is stored as XGBoost's own binary format (<name>.ubj) next to a small
+# JSON manifest (<name>.manifest.json) holding the feature order, training window,
+# hyperparameters and hold-out metrics. Loading needs neither sklearn nor pickle,
+# takes milliseconds and keeps working across library upgrades. xgboost itself is
+# only imported when a model is actually saved or loaded.
+
+MANIFEST_SUFFIX = '.manifest.json'
+
+def manifest_path(path):
+    return os.path.splitext(path)[0] + MANIFEST_SUFFIX
+
+def artifact_paths(path):
+    return [path, manifest_path(path)]
+
+def _json_value(value):
+    if hasattr(value, 'item'):
+        return value.item()
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+def save_model(model, path, features, params=None, metrics=None, training_window=None, **extra):
+    import xgboost as xgb
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    manifest = {
+        'format': 'xgboost-ubj',
+        'xgboost_version': xgb.__version__,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'features': list(features),
+        'params': {k: _json_value(v) for k, v in (params or {}).items()},
+        'metrics': {k: _json_value(v) for k, v in (metrics or {}).items()},
+        'training_window': [_json_value(d) for d in training_window] if training_window is not None else None,
+        'num_trees': booster.num_boosted_rounds(),
+        **{k: _json_value(v) for k, v in extra.items()},
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    root, ext = os.path.splitext(path)
+    # Write both files first, then publish the model before its manifest
+    booster.save_model(f"{root}.tmp{ext}")
+    with open(manifest_path(path) + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{root}.tmp{ext}", path)
+    os.replace(manifest_path(path) + '.tmp', manifest_path(path))
+    return manifest
+
+def load_manifest(path):
+    path = manifest_path(path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def load_model(path):
+    # (booster, manifest); a pickled model from an older release is converted on first use
+    import xgboost as xgb
+    if not os.path.exists(path) and os.path.exists(os.path.splitext(path)[0] + '.joblib'):
+        migrate_legacy(path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model not found: {path}")
+    manifest = load_manifest(path) or {}
+    booster = xgb.Booster(model_file=path)
+    if manifest.get('features'):
+        booster.feature_names = manifest['features']
+    return booster, manifest
+
+def migrate_legacy(path):
+    # One-time conversion of a joblib pickle (an XGBRegressor or a {'model': ...} bundle)
+    import joblib
+    legacy_path = os.path.splitext(path)[0] + '.joblib'
+    print(f"--- Converting legacy model {legacy_path} to {path} ---")
+    obj = joblib.load(legacy_path)
+    extra = {k: v for k, v in obj.items() if k != 'model'} if isinstance(obj, dict) else {}
+    model = obj['model'] if isinstance(obj, dict) else obj
+    features = extra.pop('features', None) or model.get_booster().feature_names
+    params = {k: v for k, v in model.get_params().items() if isinstance(v, (int, float, str)) and v == v}
+    return save_model(model, path, features, params=params, **extra)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Convert legacy .joblib models and show model manifests.")
+    parser.add_argument('paths', nargs='+', help="Native model paths, e.g. models/sales_model.ubj")
+    args = parser.parse_args()
+    for path in args.paths:
+        start = time.perf_counter()
+        booster, manifest = load_model(path)
+        print(f"{path}: {booster.num_boosted_rounds()} trees, loaded in {(time.perf_counter() - start) * 1000:.1f} ms")
+        print(json.dumps(manifest, indent=2))
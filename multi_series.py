@@ -0,0 +1,152 @@
+import pandas as pd
+import numpy as np
+import os
+import time
+from xgboost import XGBRegressor
+from sklearn.metrics import mean_absolute_error
+
+from execution_config import execution_plan
+from features import FEATURE_COLUMNS, HISTORY_WINDOW, build_features
+from forecast_engine import RecursiveForecaster
+from model_store import load_model, save_model
+from preprocess_data import INGEST_COLUMNS, RAW_FILE, iter_transaction_chunks, load_raw_transactions
+
+PANEL_FILE = os.path.join('data', 'processed_series_sales.parquet')
+GLOBAL_MODEL_PATH = os.path.join('models', 'global_series_model.ubj')
+SERIES_FORECAST_FILE = os.path.join('data', 'series_forecast.csv')
+
+DEFAULT_KEYS = ('StockCode', 'Country')
+
+# Sensible defaults for a global model over thousands of short, noisy series
+GLOBAL_MODEL_PARAMS = {
+    'n_estimators': 500, 'learning_rate': 0.05, 'max_depth': 7,
+    'subsample': 0.8, 'colsample_bytree': 0.8,
+}
+
+def series_sales(df, keys):
+    # (keys..., Date, Sales) totals of the valid lines of one frame or chunk
+    valid = (df['Quantity'] > 0) & (df['UnitPrice'] > 0) & df['CustomerID'].notna()
+    sales = (df['Quantity'] * df['UnitPrice']).rename('Sales')[valid]
+    # Categorical keys group on their codes; only the grouped result gets string keys
+    groups = [df[k][valid] for k in keys] + [df['InvoiceDate'][valid].dt.normalize().rename('Date')]
+    long = sales.groupby(groups, observed=True).sum().reset_index()
+    for k in keys:
+        long[k] = long[k].astype(str)
+    return long
+
+def prepare_series_panel(keys=DEFAULT_KEYS, min_active_days=30, source=None, stream=False, chunksize=500_000):
+    # Stack every series on one dense (series, day) grid from the cleaned transactions
+    print(f"--- Building series panel keyed by {', '.join(keys)} ---")
+    start_time = time.time()
+    keys = list(keys)
+    columns = sorted(set(INGEST_COLUMNS) | set(keys))
+
+    if stream:
+        # Same chunked CSV/Parquet reader as preprocessing; partial totals are summed at the end
+        parts = [series_sales(chunk, keys) for chunk in iter_transaction_chunks(source, chunksize, columns)]
+        long = pd.concat(parts, ignore_index=True).groupby(keys + ['Date'], as_index=False)['Sales'].sum()
+        del parts
+    else:
+        df = load_raw_transactions(source or RAW_FILE, columns=columns)
+        long = series_sales(df, keys)
+        del df
+
+    # Drop series too sparse to learn from
+    active = long.groupby(keys)['Date'].transform('size')
+    long = long[active >= min_active_days]
+
+    series = long[keys].drop_duplicates().sort_values(keys).reset_index(drop=True)
+    series['series_id'] = np.arange(len(series), dtype=np.int32)
+    long = long.merge(series, on=keys)
+
+    # Dense grid: zero sales on days a series did not sell
+    dates = pd.date_range(long['Date'].min(), long['Date'].max(), freq='D')
+    grid = pd.DataFrame({
+        'series_id': np.repeat(series['series_id'].values, len(dates)),
+        'Date': np.tile(dates.values, len(series)),
+    })
+    panel = grid.merge(long[['series_id', 'Date', 'Sales']], on=['series_id', 'Date'], how='left')
+    panel['Sales'] = panel['Sales'].fillna(0)
+    panel = panel.merge(series, on='series_id')
+
+    # Per-series 5.0 IQR cap over observed days, computed in one grouped pass
+    observed = panel[panel['Sales'] > 0]
+    quartiles = observed.groupby('series_id')['Sales'].quantile([0.25, 0.75]).unstack()
+    caps = quartiles[0.75] + 5.0 * (quartiles[0.75] - quartiles[0.25])
+    panel['Sales_clipped'] = panel['Sales'].clip(upper=panel['series_id'].map(caps))
+
+    os.makedirs('data', exist_ok=True)
+    panel.to_parquet(PANEL_FILE, index=False)
+    print(f"--- {len(series)} series x {len(dates)} days saved to: {PANEL_FILE} "
+          f"({time.time() - start_time:.2f} seconds) ---")
+    return panel
+
+def load_panel():
+    if not os.path.exists(PANEL_FILE):
+        raise FileNotFoundError("Series panel not found! Please run prepare_series_panel() first.")
+    return pd.read_parquet(PANEL_FILE)
+
+def train_global_model(holdout_days=30, cores=None):
+    print("--- [1/2] Loading Series Panel for Global Training ---")
+    panel = load_panel()
+    keys = [c for c in panel.columns if c not in ('series_id', 'Date', 'Sales', 'Sales_clipped')]
+    print(f"--- Loaded {panel['series_id'].nunique()} series ({len(panel):,} rows). ---")
+
+    print("--- [2/2] Training Global XGBoost Model ---")
+    model_df = build_features(panel, group_col='series_id', date_col='Date')
+    split_date = model_df['Date'].max() - pd.Timedelta(days=holdout_days - 1)
+    train = model_df[model_df['Date'] < split_date]
+    test = model_df[model_df['Date'] >= split_date]
+
+    model = XGBRegressor(objective='reg:squarederror', random_state=42, n_jobs=execution_plan(len(train), cores)['fit_nthread'], **GLOBAL_MODEL_PARAMS)
+    model.fit(train[FEATURE_COLUMNS].astype(np.float32), train['Sales_clipped'])
+
+    y_pred = np.maximum(model.predict(test[FEATURE_COLUMNS].astype(np.float32)), 0)
+    mae = mean_absolute_error(test['Sales'], y_pred)
+    print(f"--- Hold-out MAE across all series (last {holdout_days} days): {mae:,.2f} ---")
+
+    os.makedirs('models', exist_ok=True)
+    save_model(model, GLOBAL_MODEL_PATH, FEATURE_COLUMNS, params=GLOBAL_MODEL_PARAMS,
+               metrics={'holdout_mae': mae}, training_window=(train['Date'].min(), train['Date'].max()), keys=keys)
+    print(f"--- Global model saved successfully at: {GLOBAL_MODEL_PATH} ---")
+    return model
+
+def generate_series_forecast(horizon=30, cores=None):
+    print(f"--- Generating {horizon}-Day Forecast for Every Series ---")
+    if not os.path.exists(GLOBAL_MODEL_PATH):
+        raise FileNotFoundError("Global model not found! Please run train_global_model() first.")
+    model, manifest = load_model(GLOBAL_MODEL_PATH)
+    model.set_param('nthread', execution_plan(cores=cores)['fit_nthread'])
+    keys = manifest['keys']
+    panel = load_panel().sort_values(['series_id', 'Date'])
+
+    # (series x 30) window of the most recent clipped values
+    series = panel.drop_duplicates('series_id')[['series_id'] + keys].reset_index(drop=True)
+    n_series = len(series)
+    window = panel['Sales_clipped'].values.reshape(n_series, -1)[:, -HISTORY_WINDOW:].astype(np.float64)
+    last_date = panel['Date'].max()
+    forecast_dates = pd.date_range(last_date + pd.Timedelta(days=1), periods=horizon)
+
+    # One in-place predict call per day advances every series at once
+    preds = RecursiveForecaster(model, window).forecast(forecast_dates)
+
+    out = series.loc[series.index.repeat(horizon), keys].reset_index(drop=True)
+    out.insert(0, 'Date', np.tile(forecast_dates.values, n_series))
+    out['Predicted_Sales'] = preds.ravel()
+    out.to_csv(SERIES_FORECAST_FILE, index=False)
+    print(f"--- Series forecast saved to: {SERIES_FORECAST_FILE} ---")
+    return out
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Global multi-series forecasting at SKU / Country granularity.")
+    parser.add_argument('--keys', nargs='+', default=list(DEFAULT_KEYS), help="Columns identifying a series")
+    parser.add_argument('--min-active-days', type=int, default=30, help="Drop series with fewer selling days")
+    parser.add_argument('--horizon', type=int, default=30, help="Days to forecast per series")
+    parser.add_argument('--stream', metavar='PATH', help="Read a CSV/Parquet transaction export in chunks instead of the workbook")
+    parser.add_argument('--chunksize', type=int, default=500_000, help="Rows per chunk in streaming mode")
+    args = parser.parse_args()
+    prepare_series_panel(keys=args.keys, min_active_days=args.min_active_days,
+                         source=args.stream, stream=args.stream is not None, chunksize=args.chunksize)
+    train_global_model()
+    generate_series_forecast(horizon=args.horizon)
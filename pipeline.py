@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import time
+
+STATE_FILE = os.path.join('data', 'pipeline_state.json')
+
+class Stage:
+    # One node of the pipeline DAG. Its fingerprint covers the content of every
+    # input file (raw data and upstream artifacts), the code that produces it and
+    # its parameters, so it reruns only when one of those actually changes.
+    # Optional outputs are rebuilt when missing, but only if the inputs exist:
+    # without them the stage keeps its core outputs.
+
+    def __init__(self, name, run, inputs=(), outputs=(), code=(), params=None, optional_outputs=()):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.optional_outputs = list(optional_outputs)
+        self.code = list(code)
+        self.params = params or {}
+
+def parse_duration(text):
+    # "60s", "5m", "1h" or plain seconds -> seconds
+    text = str(text).strip().lower()
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+def load_state():
+    if not os.path.exists(STATE_FILE):
+        return {'stages': {}, 'hashes': {}}
+    with open(STATE_FILE) as f:
+        return json.load(f)
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_file = STATE_FILE + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, STATE_FILE)
+
+def file_digest(path, state):
+    # Content hash, memoised on (size, mtime) so unchanged files are not re-read
+    if not os.path.exists(path):
+        return 'missing'
+    stat = os.stat(path)
+    key = [stat.st_size, stat.st_mtime_ns]
+    cached = state['hashes'].get(path)
+    if cached and cached['key'] == key:
+        return cached['sha256']
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    state['hashes'][path] = {'key': key, 'sha256': digest.hexdigest()}
+    return digest.hexdigest()
+
+def fingerprint(stage, state):
+    payload = {
+        'inputs': {p: file_digest(p, state) for p in stage.inputs},
+        'code': {p: file_digest(p, state) for p in stage.code},
+        'params': stage.params,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+def stage_status(stage, state, force=False):
+    # 'run', 'fresh' (fingerprint matches), 'adopt' (outputs predate the state
+    # file) or 'keep' (inputs are missing but the core outputs exist)
+    outputs_exist = all(os.path.exists(p) for p in stage.outputs)
+    if outputs_exist and any(not os.path.exists(p) for p in stage.inputs):
+        return 'keep'
+    if force or not outputs_exist or not all(os.path.exists(p) for p in stage.optional_outputs):
+        return 'run'
+    record = state['stages'].get(stage.name)
+    if record is None:
+        return 'adopt'
+    return 'fresh' if record['fingerprint'] == fingerprint(stage, state) else 'run'
+
+def run_pipeline(stages, force=False, check=False):
+    # Stages are given in dependency order; a rerun upstream changes the hashes
+    # of its outputs, which in turn changes the fingerprint of its consumers.
+    # With check=True nothing runs or is recorded: the stale stages are returned.
+    state = load_state()
+    ran, stale_outputs = [], set()
+    for number, stage in enumerate(stages, start=1):
+        status = stage_status(stage, state, force)
+        if check and (status == 'run' or stale_outputs.intersection(stage.inputs)):
+            print(f"\nStep {number}: {stage.name} is stale.")
+            ran.append(stage.name)
+            stale_outputs.update(stage.outputs + stage.optional_outputs)
+            continue
+        if status == 'fresh':
+            print(f"\nStep {number}: {stage.name} is up to date. Skipping...")
+        elif status == 'keep':
+            print(f"\nStep {number}: {stage.name} inputs not found. Reusing existing artifacts...")
+        elif status == 'adopt':
+            print(f"\nStep {number}: {stage.name} artifacts already exist. Skipping (use --refresh to rebuild)...")
+        else:
+            print(f"\nStep {number}: Running {stage.name}...")
+            stage.run()
+            ran.append(stage.name)
+        if check:
+            continue
+        if status in ('run', 'adopt'):
+            state['stages'][stage.name] = {
+                'fingerprint': fingerprint(stage, state),
+                'outputs': {p: file_digest(p, state) for p in stage.outputs + stage.optional_outputs},
+                'updated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+        save_state(state)
+    return ran
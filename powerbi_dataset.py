@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+
+# Partitioned Power BI dataset.
+#
+# The master report is stored as one Parquet file per calendar month
+# (data/powerbi/year=2011/month=12/part.parquet) with dictionary-encoded
+# Category / Weekday / Month columns. _manifest.json keeps a content hash per
+# partition, so a nightly run only rewrites the months whose rows changed
+# (the newest actuals and the forecast window) and deletes months that no
+# longer exist. Every file carries all report columns, so the folder can be
+# loaded as-is with Power BI's "Folder" or "Parquet" connectors.
+
+DATASET_FOLDER = os.path.join('data', 'powerbi')
+MANIFEST_FILE = '_manifest.json'
+PART_FILE = 'part.parquet'
+DATASET_SCHEMA = 1
+
+CATEGORIES = ['Actual', 'Forecast']
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+          'August', 'September', 'October', 'November', 'December']
+
+def manifest_file(folder=DATASET_FOLDER):
+    return os.path.join(folder, MANIFEST_FILE)
+
+def load_manifest(folder=DATASET_FOLDER):
+    path = manifest_file(folder)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    return manifest if manifest.get('schema') == DATASET_SCHEMA else None
+
+def to_columnar(master_bi):
+    # Fixed category lists keep every partition's schema identical
+    df = master_bi.copy()
+    df['Category'] = pd.Categorical(df['Category'], categories=CATEGORIES)
+    df['Weekday'] = pd.Categorical(df['Weekday'], categories=WEEKDAYS, ordered=True)
+    df['Month'] = pd.Categorical(df['Month'], categories=MONTHS, ordered=True)
+    df['IsWeekend'] = df['IsWeekend'].astype(str) == 'True'
+    df['Year'] = df['Year'].astype('int16')
+    return df
+
+def _partition_hash(part):
+    digest = hashlib.sha1(pd.util.hash_pandas_object(part, index=False).values.tobytes())
+    digest.update(','.join(f"{c}:{t}" for c, t in part.dtypes.astype(str).items()).encode())
+    return digest.hexdigest()
+
+def write_dataset(master_bi, folder=DATASET_FOLDER):
+    # Returns (partitions written, partitions total)
+    df = to_columnar(master_bi)
+    previous = (load_manifest(folder) or {}).get('partitions', {})
+    partitions = {}
+    written = 0
+    for (year, month), part in df.groupby([df['Date'].dt.year, df['Date'].dt.month], sort=True):
+        key = f"year={year}/month={month:02d}"
+        part_hash = _partition_hash(part.reset_index(drop=True))
+        path = os.path.join(folder, key, PART_FILE)
+        partitions[key] = {'file': f"{key}/{PART_FILE}", 'rows': len(part), 'hash': part_hash}
+        if previous.get(key, {}).get('hash') == part_hash and os.path.exists(path):
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Hidden temp name: dataset readers skip files starting with '.' or '_'
+        tmp_path = os.path.join(os.path.dirname(path), f".{PART_FILE}.tmp")
+        # Millisecond timestamps: Power BI cannot read nanosecond Parquet timestamps
+        part.to_parquet(tmp_path, index=False, coerce_timestamps='ms', allow_truncated_timestamps=True)
+        os.replace(tmp_path, path)
+        written += 1
+
+    for key in set(previous) - set(partitions):
+        shutil.rmtree(os.path.join(folder, key), ignore_errors=True)
+        year_folder = os.path.join(folder, key.split('/')[0])
+        if os.path.isdir(year_folder) and not os.listdir(year_folder):
+            os.rmdir(year_folder)
+
+    manifest = {
+        'schema': DATASET_SCHEMA,
+        'updated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'rows': len(df),
+        'partitions': partitions,
+    }
+    os.makedirs(folder, exist_ok=True)
+    with open(manifest_file(folder) + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_file(folder) + '.tmp', manifest_file(folder))
+    return written, len(partitions)
+
+def read_dataset(folder=DATASET_FOLDER):
+    # Reads exactly the partitions listed in the manifest, oldest first
+    manifest = load_manifest(folder)
+    if manifest is None:
+        return None
+    files = [os.path.join(folder, p['file']) for _, p in sorted(manifest['partitions'].items())]
+    df = pd.concat([pd.read_parquet(path) for path in files], ignore_index=True)
+    df['Date'] = df['Date'].astype('datetime64[ns]')
+    return df
+
+if __name__ == "__main__":
+    manifest = load_manifest()
+    if manifest is None:
+        print(f"No Power BI dataset found in {DATASET_FOLDER}.")
+    else:
+        print(f"--- {DATASET_FOLDER}: {manifest['rows']:,} rows in {len(manifest['partitions'])} partitions (updated {manifest['updated']}) ---")
+        for key, part in sorted(manifest['partitions'].items()):
+            print(f"{key:<22} {part['rows']:>6} rows  {part['hash'][:12]}")
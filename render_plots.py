@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from execution_config import execution_plan
+from instrumentation import annotate, instrumented, record, span
+
+PROCESSED_FILE = os.path.join('data', 'processed_daily_sales.csv')
+FORECAST_FILE = os.path.join('data', 'forecast.csv')
+PLOTS_FOLDER = 'plots'
+RENDER_STATE_FILE = os.path.join(PLOTS_FOLDER, '.render_state.json')
+
+# full: the publication PNGs, preview: fast low-DPI PNGs, vector: resolution-free SVGs
+PROFILES = {
+    'full': {'ext': 'png', 'dpi': None},
+    'preview': {'ext': 'png', 'dpi': 72},
+    'vector': {'ext': 'svg', 'dpi': None},
+}
+DAYS_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+def _setup_style():
+    import matplotlib
+    matplotlib.use('Agg')
+    import seaborn as sns
+    sns.set_theme(style="whitegrid")
+
+# ---------------------------------------------------------
+# The 7 analytical plots. Each takes only the arrays it draws and imports its
+# libraries itself, so building the pipeline DAG stays cheap.
+# ---------------------------------------------------------
+def plot_main_forecast(d, path, dpi):
+    import numpy as np
+    import matplotlib.pyplot as plt
+    plt.figure(figsize=(15, 7))
+    full_plot_dates = np.concatenate([d['last_date'], d['forecast_dates']])
+    full_plot_values = np.concatenate([d['last_sales'], d['forecast']])
+    plt.plot(d['hist_dates'], d['hist_sales'], label='Historical Sales (Actual)', color='royalblue', alpha=0.5)
+    plt.plot(full_plot_dates, full_plot_values, label='ML Future Forecast (Predicted)', color='darkorange', linewidth=3)
+    if 'lower' in d:
+        plt.fill_between(d['forecast_dates'], d['lower'], d['upper'], color='orange', alpha=0.1, label='P10-P90 Prediction Interval')
+    else:
+        plt.fill_between(d['forecast_dates'], d['forecast']*0.85, d['forecast']*1.15, color='orange', alpha=0.1, label='Prediction Variance Range')
+    plt.axvline(d['last_date'][0], color='red', linestyle='--', alpha=0.5, label='Forecast Horizon Trigger')
+    plt.title('Unified Historical & Future Sales Pipeline', fontsize=16, fontweight='bold')
+    plt.legend(frameon=True, shadow=True, loc='upper left'); plt.savefig(path, dpi=dpi or 300); plt.close()
+
+def plot_risk_fan(d, path, dpi):
+    import matplotlib.pyplot as plt
+    plt.figure(figsize=(12, 6)); plt.plot(d['forecast_dates'], d['forecast'], color='black', label='Core Prediction Path')
+    if 'lower' in d:
+        # Simulated P10/P90: 80% of the Monte Carlo paths fall inside
+        plt.fill_between(d['forecast_dates'], d['lower'], d['upper'], color='orange', alpha=0.2, label='80% Prediction Interval (P10-P90)')
+    else:
+        plt.fill_between(d['forecast_dates'], d['forecast']*0.8, d['forecast']*1.2, color='orange', alpha=0.2, label='80% Confidence Band')
+    plt.title('ML Probability & Risk Distribution', fontweight='bold'); plt.legend(frameon=True); plt.savefig(path, dpi=dpi or 'figure'); plt.close()
+
+def plot_revenue_donut(d, path, dpi):
+    import pandas as pd
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    plt.figure(figsize=(10, 8))
+    # Get Predicted Average per Weekday, sorted by weekday order
+    pred_temp = pd.Series(d['forecast'], index=pd.DatetimeIndex(d['forecast_dates']))
+    pred_day_rev = pred_temp.groupby(pred_temp.index.day_name()).mean().reindex(DAYS_ORDER).fillna(0)
+
+    plt.pie(pred_day_rev, labels=pred_day_rev.index, autopct='%1.1f%%',
+            colors=sns.color_palette('viridis', 7), pctdistance=0.85,
+            textprops={'fontweight':'bold', 'color':'black'}, wedgeprops={'alpha':0.8})
+    plt.gca().add_artist(plt.Circle((0,0), 0.7, fc='white'))
+    plt.title('Predicted Sales Distribution by Weekday', fontweight='bold', fontsize=14)
+    plt.legend(pred_day_rev.index, title="Weekdays", loc="center right", bbox_to_anchor=(1.2, 0.5))
+    plt.tight_layout()
+    plt.savefig(path, dpi=dpi or 300); plt.close()
+
+def plot_daily_roadmap(d, path, dpi):
+    import pandas as pd
+    import numpy as np
+    import matplotlib.pyplot as plt
+    plt.figure(figsize=(14, 7))
+    plt.bar(d['hist_dates'], d['hist_sales'], color='gray', alpha=0.3, label='Recent Historical Sales (Actual)')
+    plt.bar(d['forecast_dates'], d['forecast'], color='skyblue', label='Future Sales Forecast (Predicted)')
+    trend = pd.Series(np.concatenate([d['hist_sales'], d['forecast']]), index=np.concatenate([d['hist_dates'], d['forecast_dates']]))
+    plt.plot(trend, color='darkorange', marker='o', markersize=4, label='Sales Trendline')
+    plt.axvline(d['last_date'][0], color='red', linestyle='--', linewidth=2, label='Forecast Start Line')
+    plt.title('30-Day Predictive Sales Roadmap (Actual + Forecast)', fontweight='bold', fontsize=14)
+    plt.xlabel('Date'); plt.ylabel('Sales Revenue')
+    plt.legend(frameon=True, shadow=True); plt.savefig(path, dpi=dpi or 300); plt.close()
+
+def plot_peak_detection(d, path, dpi):
+    import numpy as np
+    import matplotlib.pyplot as plt
+    plt.figure(figsize=(14, 6)); plt.plot(d['forecast_dates'], d['forecast'], color='darkorange', linewidth=3, label='Predicted Demand Path')
+    peaks = np.argsort(-d['forecast'], kind='stable')[:5]
+    plt.scatter(d['forecast_dates'][peaks], d['forecast'][peaks], color='red', s=150, edgecolors='black', label='Critical Surge Alert', zorder=5)
+    plt.title('Top 5 Predicted Demand Peaks', fontweight='bold'); plt.legend(); plt.savefig(path, dpi=dpi or 'figure'); plt.close()
+
+def plot_distribution_compare(d, path, dpi):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    plt.figure(figsize=(10, 6)); sns.kdeplot(d['hist_sales'], fill=True, label='Past Sales Volume (Actual)', color='blue')
+    sns.kdeplot(d['forecast'], fill=True, label='Future Sales Volume (Predicted)', color='orange')
+    plt.title('Sales Volume Density Comparison', fontweight='bold'); plt.legend(); plt.savefig(path, dpi=dpi or 'figure'); plt.close()
+
+def plot_weekly_summary(d, path, dpi):
+    import matplotlib.pyplot as plt
+    plt.figure(figsize=(12, 6))
+    hist_labels = [f"Actual W{i+1}" for i in range(len(d['hist_weekly']))]
+    pred_labels = [f"Forecast W{i+1}" for i in range(len(d['pred_weekly']))]
+
+    plt.bar(hist_labels, d['hist_weekly'], color='navy', alpha=0.6, label='Historical Weekly Total')
+    plt.bar(pred_labels, d['pred_weekly'], color='gold', alpha=0.8, label='Predicted Weekly Total')
+    plt.title('Weekly Sales Pulse (Actual vs Predicted)', fontweight='bold', fontsize=14)
+    plt.ylabel('Total Revenue')
+    plt.legend(frameon=True, shadow=True)
+    plt.tight_layout()
+    plt.savefig(path, dpi=dpi or 300); plt.close()
+
+PLOTS = {
+    '1_main_forecast': plot_main_forecast,
+    '2_risk_fan': plot_risk_fan,
+    '3_revenue_donut': plot_revenue_donut,
+    '4_daily_roadmap': plot_daily_roadmap,
+    '5_peak_detection': plot_peak_detection,
+    '6_distribution_compare': plot_distribution_compare,
+    '7_weekly_summary': plot_weekly_summary,
+}
+
+def plot_inputs(daily_sales, forecast):
+    # Slice out exactly what each plot draws, so a plot's hash only changes when its picture would
+    sales = daily_sales['Sales']
+    fc = {'forecast_dates': forecast.index.values, 'forecast': forecast['Predicted_Sales'].values}
+    band = {'lower': forecast['P10'].values, 'upper': forecast['P90'].values} if 'P10' in forecast.columns else {}
+    last = {'last_date': sales.index.values[-1:], 'last_sales': sales.values[-1:]}
+    return {
+        '1_main_forecast': {**fc, **band, **last, 'hist_dates': sales.index.values[-60:], 'hist_sales': sales.values[-60:]},
+        '2_risk_fan': {**fc, **band},
+        '3_revenue_donut': fc,
+        '4_daily_roadmap': {**fc, **last, 'hist_dates': sales.index.values[-14:], 'hist_sales': sales.values[-14:]},
+        '5_peak_detection': fc,
+        '6_distribution_compare': {**fc, 'hist_sales': sales.values[-60:]},
+        '7_weekly_summary': {
+            'hist_weekly': sales.resample('W').sum().values[-4:],
+            'pred_weekly': forecast['Predicted_Sales'].resample('W').sum().values,
+        },
+    }
+
+def inputs_hash(name, inputs, profile, code_hash):
+    import numpy as np
+    digest = hashlib.sha256(f"{name}|{profile}|{code_hash}".encode())
+    for key in sorted(inputs):
+        arr = np.ascontiguousarray(inputs[key])
+        digest.update(key.encode() + str(arr.dtype).encode() + arr.tobytes())
+    return digest.hexdigest()
+
+def _render(job):
+    # Measured in the worker, recorded by the parent as plots/<name>
+    name, inputs, path, dpi = job
+    with span(name, emit=False, path=path) as s:
+        PLOTS[name](inputs, path, dpi)
+    return name, s.record
+
+def load_render_state():
+    if not os.path.exists(RENDER_STATE_FILE):
+        return {}
+    with open(RENDER_STATE_FILE) as f:
+        return json.load(f)
+
+def load_forecast():
+    import pandas as pd
+    daily_sales = pd.read_csv(PROCESSED_FILE, index_col='Date', parse_dates=['Date']).sort_index()
+    forecast = pd.read_csv(FORECAST_FILE, index_col='Date', parse_dates=['Date'])
+    return daily_sales, forecast
+
+def plot_paths(profile='full'):
+    ext = PROFILES[profile]['ext']
+    return [os.path.join(PLOTS_FOLDER, f"{name}.{ext}") for name in PLOTS]
+
+@instrumented('plots')
+def render_plots(profile='full', workers=None, force=False, cores=None):
+    print(f"--- Rendering analytical plots ({profile} profile) ---")
+    start = time.time()
+    daily_sales, forecast = load_forecast()
+    os.makedirs(PLOTS_FOLDER, exist_ok=True)
+    with open(__file__, 'rb') as f:
+        code_hash = hashlib.sha256(f.read()).hexdigest()
+
+    # Skip plots whose inputs (and the rendering code) are unchanged
+    state = load_render_state()
+    jobs = []
+    for name, inputs in plot_inputs(daily_sales, forecast).items():
+        path = os.path.join(PLOTS_FOLDER, f"{name}.{PROFILES[profile]['ext']}")
+        key = inputs_hash(name, inputs, profile, code_hash)
+        if not force and state.get(path) == key and os.path.exists(path):
+            continue
+        jobs.append((name, inputs, path, PROFILES[profile]['dpi']))
+        state[path] = key
+
+    if not jobs:
+        print("--- All plots are up to date. ---")
+        return []
+    workers = min(len(jobs), workers or execution_plan(cores=cores)['plot_workers'])
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_setup_style) as pool:
+            done = list(pool.map(_render, jobs))
+    else:
+        _setup_style()
+        done = [_render(job) for job in jobs]
+
+    for name, entry in done:
+        if entry is not None:
+            record({**entry, 'span': f"plots/{name}", 'stage': 'plots'}, flush_prometheus=False)
+    annotate(rows=len(done), workers=workers, profile=profile)
+    with open(RENDER_STATE_FILE, 'w') as f:
+        json.dump(state, f, indent=2)
+    print(f"--- Rendered {len(done)}/{len(PLOTS)} plot(s) with {workers} worker(s) in {time.time() - start:.2f} seconds ---")
+    return [name for name, _ in done]
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Render the 7 analytical plots from the latest forecast.")
+    parser.add_argument('--profile', choices=list(PROFILES), default='full', help="full (300 DPI PNG), preview (72 DPI PNG) or vector (SVG)")
+    parser.add_argument('--workers', type=int, help="Rendering processes (default: one per core of the CPU budget)")
+    parser.add_argument('--force', action='store_true', help="Re-render even unchanged plots")
+    args = parser.parse_args()
+    render_plots(profile=args.profile, workers=args.workers, force=args.force)
@@ -0,0 +1,140 @@
+import os
+
+import pandas as pd
+
+# Multi-resolution sales cube.
+#
+# preprocess_data.py folds the cleaned transactions once into a base table of
+# (Date, Country[, StockCode]) totals. The cube adds day / week / month rollups
+# of that base, plus 'All' rows for every key, and stores them sorted by
+# (Grain, Country, StockCode, Period) with that MultiIndex, so a slice such as
+# "Germany, weekly, last 6 months" is an index lookup instead of a scan:
+#
+#   cube = load_cube()
+#   cube_slice(cube, 'W', country='Germany', months=6)
+#
+# Period is the first day of the day, week (Monday) or month.
+
+CUBE_FILE = os.path.join('data', 'sales_cube.parquet')
+GRAINS = ['D', 'W', 'M']
+INDEX = ['Grain', 'Country', 'StockCode', 'Period']
+MEASURES = ['Sales', 'Quantity', 'Lines']
+ALL = 'All'
+
+def base_keys(stock_codes=False):
+    return ['Country', 'StockCode'] if stock_codes else ['Country']
+
+def aggregate_base(dates, sales, quantity, keys):
+    # The single group-by pass over (already filtered) transaction lines
+    frame = pd.DataFrame({'Sales': sales, 'Quantity': quantity, 'Lines': 1})
+    base = frame.groupby([dates.dt.normalize().rename('Date')] + list(keys), observed=True).sum()
+    return _string_keys(base)
+
+def _string_keys(base):
+    # Plain string keys, so partial results from different chunks line up
+    base = base.reset_index()
+    names = [c for c in base.columns if c not in MEASURES]
+    for col in names[1:]:
+        base[col] = base[col].astype(str)
+    return base.set_index(names).sort_index()
+
+def combine_base(*bases):
+    # Sum partial bases (chunks, or stored days plus newly arrived ones)
+    bases = [b for b in bases if b is not None and not b.empty]
+    if not bases:
+        return None
+    if len(bases) == 1:
+        return bases[0]
+    return pd.concat(bases).groupby(level=list(range(bases[0].index.nlevels))).sum()
+
+def _period(dates, grain):
+    if grain == 'D':
+        return dates
+    if grain == 'W':
+        return dates - pd.to_timedelta(dates.dt.dayofweek, unit='D')
+    return dates.dt.to_period('M').dt.start_time
+
+def build_cube(base):
+    # Every grain x every combination of real and 'All' keys, computed from the base table
+    base = base.reset_index()
+    stock_codes = 'StockCode' in base.columns
+    frames = []
+    for grain in GRAINS:
+        base['Period'] = _period(base['Date'], grain)
+        for country_all in (False, True):
+            # Without StockCodes in the base every row is a StockCode 'All' row
+            for stock_all in ((False, True) if stock_codes else (True,)):
+                keys = ([] if country_all else ['Country']) + ([] if stock_all else ['StockCode'])
+                rollup = base.groupby(['Period'] + keys)[MEASURES].sum().reset_index()
+                if country_all:
+                    rollup['Country'] = ALL
+                if stock_all:
+                    rollup['StockCode'] = ALL
+                rollup['Grain'] = grain
+                frames.append(rollup)
+    cube = pd.concat(frames, ignore_index=True)
+    for col in ['Grain', 'Country', 'StockCode']:
+        cube[col] = cube[col].astype('category')
+    cube['Quantity'] = cube['Quantity'].astype('int64')
+    cube['Lines'] = cube['Lines'].astype('int64')
+    return cube.set_index(INDEX).sort_index()
+
+def save_cube(cube, path=CUBE_FILE):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    cube.to_parquet(path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+def load_cube(path=CUBE_FILE):
+    if not os.path.exists(path):
+        return None
+    cube = pd.read_parquet(path)
+    return cube if cube.index.is_monotonic_increasing else cube.sort_index()
+
+def cube_stock_codes(cube):
+    return cube is not None and (cube.index.get_level_values('StockCode') != ALL).any()
+
+def cube_base(cube):
+    # The stored (Date, Country[, StockCode]) base rows, for incremental updates
+    stock_codes = cube_stock_codes(cube)
+    day = cube.xs('D', level='Grain')
+    day = day[day.index.get_level_values('Country') != ALL]
+    if stock_codes:
+        day = day[day.index.get_level_values('StockCode') != ALL]
+    else:
+        day = day.droplevel('StockCode')
+    base = day.reset_index().rename(columns={'Period': 'Date'})
+    return _string_keys(base.set_index(['Date'] + base_keys(stock_codes))[MEASURES])
+
+def cube_slice(cube, grain='D', country=ALL, stock_code=ALL, start=None, end=None, months=None):
+    # Measures of one (grain, country, stock code) series, indexed by Period
+    try:
+        series = cube.loc[(grain, country, stock_code)]
+    except KeyError:
+        return pd.DataFrame(columns=MEASURES, index=pd.DatetimeIndex([], name='Period'))
+    if months is not None and len(series):
+        start = series.index[-1] - pd.DateOffset(months=months)
+    return series.loc[start:end]
+
+def cube_countries(cube):
+    # Countries by total sales, largest first
+    totals = cube.xs(('M', ALL), level=['Grain', 'StockCode'])['Sales'].groupby(level='Country', observed=True).sum()
+    return [c for c in totals.sort_values(ascending=False).index if c != ALL]
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Look up one slice of the sales cube.")
+    parser.add_argument('--grain', choices=GRAINS, default='W', help="D (day), W (week) or M (month)")
+    parser.add_argument('--country', default=ALL)
+    parser.add_argument('--stock-code', default=ALL)
+    parser.add_argument('--months', type=int, help="Only the last N months")
+    parser.add_argument('--csv', metavar='PATH', help="Export the slice to a CSV file")
+    args = parser.parse_args()
+    cube = load_cube()
+    if cube is None:
+        print(f"No cube found at {CUBE_FILE}. Run preprocess_data.py first.")
+    else:
+        result = cube_slice(cube, args.grain, args.country, args.stock_code, months=args.months)
+        print(result.to_string(float_format=lambda v: f"{v:,.2f}"))
+        if args.csv:
+            result.to_csv(args.csv)
+            print(f"--- Slice exported to: {args.csv} ---")
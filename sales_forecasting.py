@@ -1,67 +1,145 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
+import time
 import warnings
-import joblib
 from xgboost import XGBRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from sklearn.model_selection import TimeSeriesSplit, RandomizedSearchCV
 
+from execution_config import describe, execution_plan
+from features import DIRECT_FEATURE_COLUMNS, FEATURE_COLUMNS, build_direct_features, build_features, direct_features
+from forecast_engine import RecursiveForecaster
+from instrumentation import annotate, instrumented, span
+from model_store import load_manifest, load_model, save_model
+from model_search import PARAM_GRID, halving_search, previous_best_params
+from pipeline import parse_duration
+
+MODEL_PATH = os.path.join('models', 'sales_model.ubj')
+DIRECT_MODEL_PATH = os.path.join('models', 'sales_model_direct.ubj')
+
+# Warm-start updates between full searches (train_model(mode='auto'))
+UPDATE_ROUNDS = 50          # trees added per update
+UPDATE_MIN_ROWS = 28        # boost on at least the last 4 weeks, however few days are new
+SEARCH_EVERY_DAYS = 7       # full hyperparameter search at least weekly
+DRIFT_THRESHOLD = 0.2       # full search when hold-out MAE is 20% worse than after the last search
+
 warnings.filterwarnings('ignore')
-sns.set(style="whitegrid", palette="muted")
 
 def build_advanced_features(df, target_col='Sales_clipped'):
-    data = df.copy()
-    # Time features
-    data['dayofweek'] = data.index.dayofweek
-    data['month'] = data.index.month
-    data['day'] = data.index.day
-    data['is_weekend'] = data['dayofweek'].isin([5, 6]).astype(int)
-    data['is_december'] = (data['month'] == 12).astype(int)
-    
-    # Festive Feature: Days until Christmas
-    data['days_to_christmas'] = data.index.map(lambda x: (pd.Timestamp(year=x.year, month=12, day=25) - x).days)
-    data['days_to_christmas'] = data['days_to_christmas'].apply(lambda x: x if 0 <= x <= 30 else 31)
-
-    # Cyclical Seasonality Encoding
-    data['month_sin'] = np.sin(2 * np.pi * data['month']/12)
-    data['month_cos'] = np.cos(2 * np.pi * data['month']/12)
-    data['day_sin'] = np.sin(2 * np.pi * data['dayofweek']/7)
-    data['day_cos'] = np.cos(2 * np.pi * data['dayofweek']/7)
-
-    # Advanced Lags on the target column
-    for lag in [1, 7, 14, 21, 30]:
-        data[f'lag_{lag}'] = data[target_col].shift(lag)
-    
-    # Differential Lags
-    data['diff_1_7'] = data['lag_1'] - data['lag_7']
-    
-    # Rolling Statistics
-    data['rolling_mean_7'] = data[target_col].shift(1).rolling(window=7).mean()
-    data['rolling_std_7'] = data[target_col].shift(1).rolling(window=7).std()
-    data['rolling_mean_30'] = data[target_col].shift(1).rolling(window=30).mean()
-    
-    return data.dropna()
+    # Shared, vectorised feature engine (see features.py)
+    return build_features(df, target_col=target_col)
+
+def plot_validation(y_test_real, y_pred, path='plots/accuracy_test.png'):
+    # Plotting libraries are only needed here, not to train or load the model
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set(style="whitegrid", palette="muted")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    plt.figure(figsize=(14, 7))
+    plt.plot(y_test_real.index, y_test_real.values, label='Actual Data (Real)', marker='o', alpha=0.7)
+    plt.plot(y_test_real.index, y_pred, label='ML Forecast', color='red', linestyle='--', marker='x')
+    plt.title('Validation Strategy: 30-Day Blind Back-Test', fontsize=14, fontweight='bold')
+    plt.legend(frameon=True, facecolor='white', shadow=True)
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+    plt.close()
 
-def train_model():
+def train_direct_model(daily_sales, params, horizon=30, end_date=None, nthread=None):
+    # One model for all horizons: stacked (origin, horizon) rows with horizon as a feature
+    direct_df = build_direct_features(daily_sales, horizon=horizon)
+    if end_date is not None:
+        direct_df = direct_df[direct_df.index < end_date]
+    model = XGBRegressor(objective='reg:squarederror', random_state=42, n_jobs=nthread, **params)
+    model.fit(direct_df[DIRECT_FEATURE_COLUMNS], direct_df['target'])
+    return model
+
+def update_model(X_train, y_train, X_test, y_test_real, check=True, drift_threshold=DRIFT_THRESHOLD,
+                 rounds=UPDATE_ROUNDS, min_rows=UPDATE_MIN_ROWS, model_path=MODEL_PATH, nthread=None):
+    # Continue boosting the stored model on the days it has not seen, with its searched
+    # hyperparameters. Returns (model, manifest, reason); model is None when a full search is needed.
+    manifest = load_manifest(model_path)
+    if manifest is None or not os.path.exists(model_path):
+        return None, manifest, "no stored model to update"
+    if manifest.get('features') != FEATURE_COLUMNS:
+        return None, manifest, "the stored model was trained on a different feature set"
+    if not manifest.get('training_window'):
+        return None, manifest, "stored model has no training window"
+    searched = manifest.get('searched')
+    if check and (searched is None or time.time() - time.mktime(time.strptime(searched, '%Y-%m-%dT%H:%M:%S')) > SEARCH_EVERY_DAYS * 86400):
+        return None, manifest, f"last full search is older than {SEARCH_EVERY_DAYS} days"
+    new_days = int((X_train.index > pd.Timestamp(manifest['training_window'][1])).sum())
+    if new_days == 0:
+        # Nothing new to learn (e.g. a settings change reran the stage): keep the stored booster
+        model = XGBRegressor(n_jobs=nthread)
+        model.load_model(model_path)
+        print(f"--- No new days since the last training: keeping the stored model ({manifest['num_trees']} trees) ---")
+    else:
+        booster, _ = load_model(model_path)
+        params = {k: v for k, v in manifest['params'].items() if k in PARAM_GRID}
+        rows = min(max(new_days, min_rows), len(X_train))
+        model = XGBRegressor(objective='reg:squarederror', random_state=42, n_jobs=nthread, **{**params, 'n_estimators': rounds})
+        model.fit(X_train.iloc[-rows:], y_train.iloc[-rows:], xgb_model=booster)
+        print(f"--- Continued boosting on {new_days} new day(s) ({rows} rows): {booster.num_boosted_rounds()} -> {model.get_booster().num_boosted_rounds()} trees ---")
+
+    mae = mean_absolute_error(y_test_real, model.predict(X_test))
+    baseline = manifest.get('search_metrics', manifest['metrics']).get('holdout_mae')
+    annotate(new_days=new_days, holdout_mae=mae, baseline_mae=baseline)
+    if check and baseline and mae > baseline * (1 + drift_threshold):
+        return None, manifest, f"drift: hold-out MAE {mae:,.2f} vs {baseline:,.2f} after the last search"
+    return model, manifest, None
+
+def compare_strategies(daily_sales, recursive_model, direct_model, holdout_dates):
+    # Full multi-step forecast from the hold-out origin with both strategies
+    history = daily_sales.loc[daily_sales.index < holdout_dates[0], 'Sales_clipped'].values
+    actual = daily_sales.loc[holdout_dates, 'Sales'].values
+
+    start = time.perf_counter()
+    recursive_pred = RecursiveForecaster(recursive_model, history).forecast(holdout_dates)[0]
+    recursive_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    X = direct_features(history, holdout_dates)
+    direct_pred = np.maximum(direct_model.get_booster().inplace_predict(X), 0)
+    direct_time = time.perf_counter() - start
+
+    rows = []
+    for name, pred, elapsed in [('recursive', recursive_pred, recursive_time), ('direct', direct_pred, direct_time)]:
+        rows.append({
+            'Strategy': name,
+            'MAE': mean_absolute_error(actual, pred),
+            'RMSE': np.sqrt(mean_squared_error(actual, pred)),
+            'Latency_ms': elapsed * 1000,
+        })
+    comparison = pd.DataFrame(rows)
+    comparison.to_csv(os.path.join('data', 'strategy_comparison.csv'), index=False)
+    print("--- Recursive vs Direct on the 30-day hold-out ---")
+    print(comparison.to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+    return comparison
+
+@instrumented('train')
+def train_model(strategy='recursive', search='random', search_budget=None, mode='full', drift_threshold=DRIFT_THRESHOLD, cores=None):
     print("--- [1/2] Loading Preprocessed Data for Training ---")
     PROCESSED_FILE = os.path.join('data', 'processed_daily_sales.csv')
 
     if not os.path.exists(PROCESSED_FILE):
         raise FileNotFoundError("Processed data not found! Please run preprocessing first.")
 
-    daily_sales = pd.read_csv(PROCESSED_FILE)
-    daily_sales['Date'] = pd.to_datetime(daily_sales['Date'])
-    daily_sales = daily_sales.sort_values('Date').set_index('Date')
+    with span('load'):
+        daily_sales = pd.read_csv(PROCESSED_FILE)
+        daily_sales['Date'] = pd.to_datetime(daily_sales['Date'])
+        daily_sales = daily_sales.sort_values('Date').set_index('Date')
+    annotate(rows=len(daily_sales))
 
     print(f"--- Loaded {len(daily_sales)} days of sales records. ---")
 
     print("--- [2/2] Training XGBoost Model ---")
-    model_df = build_advanced_features(daily_sales, target_col='Sales_clipped')
+    with span('features', rows=len(daily_sales)):
+        model_df = build_advanced_features(daily_sales, target_col='Sales_clipped')
 
-    X = model_df.drop(['Sales', 'Sales_clipped'], axis=1)
+    X = model_df[FEATURE_COLUMNS]
     y = model_df['Sales_clipped']
     y_real = model_df['Sales']
 
@@ -71,39 +149,69 @@ def train_model():
     y_train, y_test = y.iloc[:split_idx], y.iloc[split_idx:]
     y_test_real = y_real.iloc[split_idx:]
 
-    xgb = XGBRegressor(objective='reg:squarederror', random_state=42)
-    param_grid = {
-        'n_estimators': [500, 1000],
-        'learning_rate': [0.01, 0.05, 0.1],
-        'max_depth': [3, 5, 7],
-        'subsample': [0.8, 1.0],
-        'colsample_bytree': [0.8, 1.0]
-    }
-
-    tscv = TimeSeriesSplit(n_splits=5)
-    random_search = RandomizedSearchCV(xgb, param_grid, n_iter=20, cv=tscv, scoring='neg_mean_absolute_error', n_jobs=-1, random_state=42)
-    random_search.fit(X_train, y_train)
+    # Random search: 20 candidates x 5 folds share the core budget with each fit's threads
+    plan = execution_plan(len(X_train), cores, tasks=20 * 5)
+    annotate(cores=plan['cores'], search_jobs=plan['search_jobs'], nthread=plan['nthread'])
+    print(f"--- CPU plan: {describe(plan)} ---")
+
+    best_model, previous = None, None
+    if mode != 'full':
+        # 'update' searches only without a usable stored model; 'auto' also searches when one is due or the model drifted
+        with span('update', rows=len(X_train)):
+            best_model, previous, reason = update_model(X_train, y_train, X_test, y_test_real, check=(mode == 'auto'),
+                                                        drift_threshold=drift_threshold, nthread=plan['fit_nthread'])
+        if best_model is None:
+            print(f"--- Full search required: {reason} ---")
+
+    if best_model is not None:
+        search, best_params = 'update', previous['params']
+        print(f"--- Kept searched parameters: {best_params} ---")
+    else:
+        if search_budget is not None:
+            search = 'halving'
+        with span('search', rows=len(X_train), mode=search):
+            if search == 'halving':
+                # Budgeted successive halving with early stopping, seeded with the last model's params
+                warm_start = previous_best_params(MODEL_PATH)
+                if warm_start:
+                    print(f"--- Warm-starting search from previous parameters: {warm_start} ---")
+                # Each candidate's 5 CV folds run in parallel within the core budget
+                halving_plan = execution_plan(len(X_train), cores, tasks=5)
+                print(f"--- Halving CPU plan: {halving_plan['search_jobs']} fold(s) x {halving_plan['nthread']} thread(s) ---")
+                best_model, best_params = halving_search(X_train, y_train, budget_s=search_budget, warm_start=warm_start,
+                                                         nthread=halving_plan['nthread'], n_jobs=halving_plan['search_jobs'])
+            else:
+                xgb = XGBRegressor(objective='reg:squarederror', random_state=42, n_jobs=plan['nthread'])
+                tscv = TimeSeriesSplit(n_splits=5)
+                random_search = RandomizedSearchCV(xgb, PARAM_GRID, n_iter=20, cv=tscv, scoring='neg_mean_absolute_error', n_jobs=plan['search_jobs'], random_state=42)
+                random_search.fit(X_train, y_train)
+                best_model, best_params = random_search.best_estimator_, random_search.best_params_
+        print(f"--- Best Parameters Found: {best_params} ---")
 
-    best_model = random_search.best_estimator_
-    print(f"--- Best Parameters Found: {random_search.best_params_} ---")
-
-    # Save the trained model
-    os.makedirs('models', exist_ok=True)
-    MODEL_PATH = os.path.join('models', 'sales_model.joblib')
-    joblib.dump(best_model, MODEL_PATH)
+    y_pred = best_model.predict(X_test)
+    metrics = {
+        'holdout_mae': mean_absolute_error(y_test_real, y_pred),
+        'holdout_rmse': np.sqrt(mean_squared_error(y_test_real, y_pred)),
+        'holdout_r2': r2_score(y_test_real, y_pred),
+    }
+    if search == 'update':
+        # The drift baseline and search date stay those of the last full search
+        lineage = {'searched': previous.get('searched'), 'search_metrics': previous.get('search_metrics', previous['metrics']),
+                   'updates': previous.get('updates', 0) + (best_model.get_booster().num_boosted_rounds() != previous['num_trees'])}
+        window_start = previous['training_window'][0]
+    else:
+        lineage = {'searched': time.strftime('%Y-%m-%dT%H:%M:%S'), 'search_metrics': metrics, 'updates': 0}
+        window_start = X_train.index[0]
+
+    # Save the trained model as a native XGBoost artifact with its manifest
+    with span('save'):
+        save_model(best_model, MODEL_PATH, FEATURE_COLUMNS, params=best_params, metrics=metrics,
+                   training_window=(window_start, X_train.index[-1]), strategy='recursive', search=search, **lineage)
     print(f"--- Model saved successfully at: {MODEL_PATH} ---")
 
     # Final Evaluation Plot
-    y_pred = best_model.predict(X_test)
-    os.makedirs('plots', exist_ok=True)
-    plt.figure(figsize=(14, 7))
-    plt.plot(y_test_real.index, y_test_real.values, label='Actual Data (Real)', marker='o', alpha=0.7)
-    plt.plot(y_test_real.index, y_pred, label='ML Forecast', color='red', linestyle='--', marker='x')
-    plt.title('Validation Strategy: 30-Day Blind Back-Test', fontsize=14, fontweight='bold')
-    plt.legend(frameon=True, facecolor='white', shadow=True)
-    plt.tight_layout()
-    plt.savefig('plots/accuracy_test.png', dpi=300)
-    plt.close()
+    with span('validation_plot'):
+        plot_validation(y_test_real, y_pred)
 
     # SAVE VALIDATION DATA FOR DASHBOARD
     validation_df = pd.DataFrame({
@@ -111,9 +219,36 @@ def train_model():
         'Actual': y_test_real.values,
         'Forecast': y_pred
     })
-    validation_df.to_csv('data/validation_results.csv', index=False)
+    with span('validation_export', rows=len(validation_df)):
+        validation_df.to_csv('data/validation_results.csv', index=False)
+
+    if strategy == 'direct':
+        print("--- Training Direct Multi-Horizon Model ---")
+        holdout_dates = y_test_real.index
+        # The stacked direct table has one row per (origin, horizon)
+        direct_threads = execution_plan(len(daily_sales) * 30, cores)['fit_nthread']
+        with span('direct_compare'):
+            holdout_model = train_direct_model(daily_sales, best_params, horizon=len(holdout_dates), end_date=holdout_dates[0], nthread=direct_threads)
+            compare_strategies(daily_sales, best_model, holdout_model, holdout_dates)
+
+        # Refit on the full history for production forecasts
+        with span('direct_fit', rows=len(daily_sales) * 30):
+            direct_model = train_direct_model(daily_sales, best_params, horizon=30, nthread=direct_threads)
+        save_model(direct_model, DIRECT_MODEL_PATH, DIRECT_FEATURE_COLUMNS, params=best_params,
+                   training_window=(daily_sales.index[0], daily_sales.index[-1]), strategy='direct', horizon=30)
+        print(f"--- Direct model saved successfully at: {DIRECT_MODEL_PATH} ---")
     
     return best_model
 
 if __name__ == "__main__":
-    train_model()
+    import argparse
+    parser = argparse.ArgumentParser(description="Train the XGBoost sales model.")
+    parser.add_argument('--strategy', choices=['recursive', 'direct'], default='recursive', help="Also train and compare the direct multi-horizon model")
+    parser.add_argument('--search', choices=['random', 'halving'], default='random', help="Hyperparameter search mode")
+    parser.add_argument('--search-budget', type=parse_duration, help="Wall-clock budget for the search, e.g. 60s or 5m (implies --search halving)")
+    parser.add_argument('--mode', choices=['full', 'update', 'auto'], default='full', help="Full search, continue boosting the stored model on new days, or update unless a search is due or the model drifted")
+    parser.add_argument('--drift-threshold', type=float, default=DRIFT_THRESHOLD, help="Relative hold-out MAE increase that triggers a full search in auto mode")
+    parser.add_argument('--cores', type=int, help="CPU budget shared by search jobs and XGBoost threads (default: $FORECAST_CORES or all cores)")
+    args = parser.parse_args()
+    train_model(strategy=args.strategy, search=args.search, search_budget=args.search_budget, mode=args.mode,
+                drift_threshold=args.drift_threshold, cores=args.cores)